@@ -1,4 +1,5 @@
 import { NextRequest } from 'next/server';
+import { StringDecoder } from 'string_decoder';
 import { getTask, removeTask } from '@/lib/tasks';
 
 export const runtime = 'nodejs';
@@ -72,25 +73,34 @@ export const GET = async (
           const process = taskInfo.process;
           let streamClosed = false;
           
-          // Rate limiter to prevent flooding
+          // Rate limiter for STATUS lines, to prevent flooding
           const rateLimiter = new RateLimiter();
           
           // Send connection established message
           controller.enqueue(formatSSE('SYSTEM', 'SSE connection established'));
           
+          // Incomplete trailing line carried over between stdout chunks
+          let stdoutBuffer = '';
+          // Decodes UTF-8 safely when a multi-byte character spans two chunks
+          const stdoutDecoder = new StringDecoder('utf8');
+          
           // --- Process stdout data handler ---
           const handleStdout = (data: Buffer) => {
             if (streamClosed) return;
             
             try {
-              const lines = data.toString().split('\n');
+              stdoutBuffer += stdoutDecoder.write(data);
+              const lines = stdoutBuffer.split('\n');
+              stdoutBuffer = lines.pop() || ''; // Guardar la última línea incompleta para el próximo chunk
               
               for (const line of lines) {
                 if (streamClosed) break;
                 if (!line.trim()) continue;
                 
-                // Apply rate limiting except for END events
-                if (!rateLimiter.canSendEvent() && !line.includes('END')) continue;
+                // scrape.py flushes many lines per chunk: only informational STATUS
+                // lines may be dropped when they arrive too fast; results, batches,
+                // progress and summary events must all reach the browser
+                if (line.startsWith('SSE_DATA:STATUS:') && !rateLimiter.canSendEvent()) continue;
                 
                 // Process SSE_DATA messages
                 if (line.startsWith('SSE_DATA:')) {
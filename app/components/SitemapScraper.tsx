@@ -67,7 +67,7 @@ interface SummaryData {
 
 // Type for generic SSE message structure
 interface SseMessage {
-  type: string; // e.g., STATUS, FOUND_URL, SUCCESS, FAIL, SUMMARY, END, ERROR
+  type: string; // e.g., STATUS, FOUND_URL, FOUND_URL_BATCH, SUCCESS, FAIL, SUMMARY, END, ERROR
   data: any;
 }
 
@@ -174,6 +174,7 @@ export default function SitemapScraper() {
     
     addEventHandler('STATUS', (data) => setState(prev => ({ ...prev, status: typeof data === 'string' ? data : JSON.stringify(data) })) );
     addEventHandler('FOUND_URL', (data) => setState(prev => ({ ...prev, foundUrls: [...prev.foundUrls, data as string] })) );
+    addEventHandler('FOUND_URL_BATCH', (data) => setState(prev => ({ ...prev, foundUrls: [...prev.foundUrls, ...(data as string[])] })) );
     addEventHandler('SUCCESS', (data) => setState(prev => ({ ...prev, successfulScrapes: [...prev.successfulScrapes, data as SuccessData] })) );
     addEventHandler('FAIL', (data) => setState(prev => ({ ...prev, failedScrapes: [...prev.failedScrapes, data as FailData] })) );
     addEventHandler('WARN', (data) => setState(prev => ({ ...prev, status: `Warning: ${data}` })) );
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import argparse
+import atexit
 import json
 import re
 import sys
@@ -7,14 +8,35 @@ import time
 import sqlite3
 import os
 import requests
-from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urljoin
+import lxml.html
+from lxml import etree
 import ssl
 import concurrent.futures
 from datetime import datetime
 import threading
+import queue
 import random
+from functools import lru_cache
 from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+# orjson es opcional: codificador/parser JSON en C más rápido, con json como alternativa
+try:
+    import orjson
+    json_loads = orjson.loads
+    
+    def json_dumps(data):
+        # El proceso padre decodifica stdout por fragmentos: mantener la salida
+        # en ASCII y usar json (con escapes \uXXXX) si hay caracteres no ASCII
+        encoded = orjson.dumps(data)
+        return encoded.decode('ascii') if encoded.isascii() else json.dumps(data)
+except ImportError:
+    json_loads = json.loads
+    json_dumps = json.dumps
 
 # Evitar problemas de SSL
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -25,8 +47,17 @@ DB_PATH = os.path.join(DATA_DIR, 'business_data.sqlite')
 USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/105.0.0.0 Safari/537.36'
 MAX_RETRIES = 3
 TIMEOUT = 15
-EMAIL_REGEX = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-LOCK = threading.Lock()
+POOL_SIZE = 10
+MAX_BYTES = 2 * 1024 * 1024  # Tamaño máximo de página a descargar
+MIN_BYTES = 512  # Por debajo, la página es un stub (redirección, login, error) sin datos útiles
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+MAX_ADDRESS_LEN = 200  # Longitud máxima de texto considerado como dirección
+CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+WRITE_BATCH_SIZE = 50
+WRITE_FLUSH_INTERVAL = 0.5  # Segundos máximos antes de confirmar un lote de escrituras
+WRITE_BUSY_TIMEOUT = 30  # Segundos de espera del escritor si la base de datos está bloqueada
+WRITE_RETRIES = 3  # Reintentos de un lote ante "database is locked/busy"
 
 # Limitar solicitudes por dominio
 DOMAIN_RATE_LIMIT = {
@@ -34,31 +65,196 @@ DOMAIN_RATE_LIMIT = {
     "default": 3       # 3 solicitudes por segundo para otros dominios
 }
 
-# Diccionario para rastrear la última solicitud por dominio
-last_request_time = defaultdict(float)
+# Patrones comunes de direcciones, unidos en una sola alternancia para recorrer
+# cada texto una única vez (compilados al cargar el módulo)
+FULL_ADDRESS_PATTERNS = [
+    r'\d+\s+[A-Za-z][A-Za-z\s]*\s(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr|Court|Ct|Plaza|Square|Sq|Highway|Hwy|Route|RT|Parkway|Pkwy|Circle|Cir|Terrace|Ter|Place|Pl),?\s+[A-Za-z\s]+,?\s+[A-Z]{2}\s+\d{5}(?:-\d{4})?',  # US Style
+    r'\d+\s+[A-Za-z\s]+,\s+[A-Za-z\s]+,\s+[A-Z]{2}\s+\d{5}(?:-\d{4})?',  # Simplified US
+    r'\d+\s+[A-Za-z\s]+,\s+[A-Za-z\s]+,\s+[A-Z|a-z]{1,2}\d{1,2}\s+\d{1,2}[A-Z|a-z]{2}',  # UK Postcode
+]
+ADDRESS_RE = re.compile('|'.join(f'(?:{p})' for p in FULL_ADDRESS_PATTERNS + [
+    r'calle|avenida|av\.|carrera|cra\.|carrer|via|vía|paseo|plaza|boulevard|blvd\.',  # Palabras clave en español
+    r'rua|praça|alameda|estrada|rodovia',  # Palabras clave en portugués
+]), re.IGNORECASE)
+# Solo direcciones completas (sin palabras clave sueltas), para buscar en todo el texto
+FULL_ADDRESS_RE = re.compile('|'.join(f'(?:{p})' for p in FULL_ADDRESS_PATTERNS), re.IGNORECASE)
+# Código postal de EE. UU. (ZIP / ZIP+4) o del Reino Unido
+POSTAL_RE = re.compile(r'\b\d{5}(-\d{4})?\b|\b[A-Z]{1,2}\d{1,2}\s+\d{1,2}[A-Z]{2}\b')
+DIGIT_RE = re.compile(r'\d+')
+# Correos genéricos o de plantilla que no identifican al negocio
+GENERIC_EMAIL_RE = re.compile(r'example|user|domain|noreply|no-reply|test@', re.IGNORECASE)
+CONTACT_KW_RE = re.compile(r'address|location|street|avenue|calle|avenida|rua', re.IGNORECASE)
+
+def class_test(name):
+    """Predicado XPath equivalente al selector CSS .name"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# Selectores precompilados (equivalentes XPath de los selectores CSS originales)
+TITLE_XPATH = etree.XPath("(//title)[1]")
+DESCRIPTION_XPATH = etree.XPath("(//meta[@name='description'])[1]")
+ADDRESS_XPATH = etree.XPath(
+    "//*[" + " or ".join([
+        class_test('address'), "@id='address'",
+        class_test('location'), "@id='location'",
+        class_test('contact-address'), "@itemprop='address'",
+        class_test('footer-address'), class_test('store-address'),
+    ]) + "] | //*[" + class_test('contact-info') + "]//address"
+)
+CONTACT_XPATH = etree.XPath(
+    "//footer | //*[" + " or ".join([
+        class_test('contact'), "@id='contact'",
+        class_test('contact-info'), "@id='contact-info'",
+        class_test('contacto'), "@id='contacto'",
+    ]) + "]"
+)
+# Subárboles donde suele estar la dirección (pie de página, contacto, <address>),
+# para no recorrer todos los p/div/span del documento
+ADDRESS_HINT_XPATH = etree.XPath(
+    "//footer | //address | //*[contains(@class, 'contact') or contains(@id, 'contact')"
+    " or contains(@class, 'address') or contains(@id, 'address')]"
+)
+SCHEMA_XPATH = etree.XPath("//script[@type='application/ld+json']")
+# Texto visible del body (sin scripts ni estilos) más los enlaces mailto:,
+# en orden de documento, para buscar correos y direcciones sin recorrer todo el HTML
+PAGE_TEXT_XPATH = etree.XPath(
+    "//body//text()[not(ancestor::script) and not(ancestor::style)]"
+    " | //a[starts-with(@href, 'mailto:')]/@href",
+    smart_strings=False
+)
+SCHEMA_ADDRESS_KEYS = ('streetAddress', 'addressLocality', 'addressRegion', 'postalCode')
+
+# Sesión HTTP compartida: reutiliza conexiones keep-alive entre URLs del mismo
+# dominio y reintenta con retraso exponencial los fallos de red y 429/5xx
+SESSION = requests.Session()
+SESSION.headers.update({
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Referer': 'https://www.google.com/',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0'
+})
+_adapter = HTTPAdapter(
+    pool_connections=POOL_SIZE,
+    pool_maxsize=POOL_SIZE * 2,
+    max_retries=Retry(
+        total=MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET']
+    )
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Mensajes de detalle por URL (candidatos, esperas...), activados con --verbose
+VERBOSE = False
+
+# Momento (time.monotonic) a partir del cual se permite la siguiente solicitud por dominio
+next_allowed_time = defaultdict(float)
 domain_locks = defaultdict(threading.Lock)
 
+# Salida estándar con buffer: logs y eventos SSE se acumulan en orden y se
+# escriben en bloque para no hacer un write() + flush por línea
+STDOUT_FD = sys.stdout.fileno()
+OUTPUT_FLUSH_INTERVAL = 0.01
+OUTPUT_MAX_BUFFER = 64 * 1024
+OUTPUT_LOCK = threading.Lock()
+output_buffer = []
+output_size = 0
+
+# Cola de actualizaciones de estado consumida por el hilo escritor
+WRITE_Q = queue.Queue()
+
+# Sentencias UPDATE fijas por estado (columnas en el orden de sus parámetros),
+# para que SQLite reutilice la sentencia preparada en cada llamada
+SQL_ERROR = "UPDATE businesses SET status = ?, error_message = ?, processed_at = ? WHERE url = ?"
+SQL_COMPLETED = "UPDATE businesses SET status = ?, title = ?, description = ?, email = ?, address = ?, processed_at = ? WHERE url = ?"
+STATUS_UPDATES = {
+    "error": (SQL_ERROR, ('error_message', 'processed_at')),
+    "completed": (SQL_COMPLETED, ('title', 'description', 'email', 'address', 'processed_at')),
+}
+
+def write_output(line):
+    """Añadir una línea al buffer de salida; se vacía si supera OUTPUT_MAX_BUFFER"""
+    global output_size
+    with OUTPUT_LOCK:
+        output_buffer.append(line)
+        output_size += len(line)
+        if output_size >= OUTPUT_MAX_BUFFER:
+            flush_output_locked()
+
+def flush_output_locked():
+    """Escribir el buffer de salida en stdout con una sola llamada (requiere OUTPUT_LOCK)"""
+    global output_size
+    if not output_buffer:
+        return
+    data = ''.join(output_buffer).encode('utf-8')
+    output_buffer.clear()
+    output_size = 0
+    while data:
+        written = os.write(STDOUT_FD, data)
+        data = data[written:]
+
+def flush_output():
+    """Vaciar el buffer de salida"""
+    with OUTPUT_LOCK:
+        flush_output_locked()
+
+# Lo que quede en el buffer se escribe al salir (incluido sys.exit)
+atexit.register(flush_output)
+
+def output_flusher():
+    """Hilo que vacía el buffer de salida cada OUTPUT_FLUSH_INTERVAL segundos"""
+    while True:
+        time.sleep(OUTPUT_FLUSH_INTERVAL)
+        flush_output()
+
+def start_output_flusher():
+    """Arrancar el hilo que vacía periódicamente la salida estándar"""
+    threading.Thread(target=output_flusher, name='output-flusher', daemon=True).start()
+
 def log_message(message):
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    print(f"{timestamp} - {message}")
-    sys.stdout.flush()
+    write_output(f"{timestamp} - {message}\n")
+
+def log_debug(message, *args):
+    """Mensaje de detalle por URL, solo con --verbose.
+    
+    Los argumentos se formatean con % únicamente si el mensaje se va a escribir.
+    """
+    if VERBOSE:
+        log_message(message % args)
 
 def send_sse_event(event_type, data):
     """Enviar un evento SSE al proceso padre"""
-    json_data = json.dumps(data)
-    print(f"SSE_DATA:{event_type}:{json_data}")
-    sys.stdout.flush()
+    json_data = json_dumps(data)
+    write_output(f"SSE_DATA:{event_type}:{json_data}\n")
 
-def connect_db():
+def connect_db(timeout=5.0):
     """Conectar a la base de datos SQLite"""
-    return sqlite3.connect(DB_PATH)
+    return sqlite3.connect(DB_PATH, timeout=timeout)
+
+def ensure_indexes():
+    """Crear una sola vez, al arrancar, los índices que usan las consultas del script"""
+    conn = connect_db()
+    # Índice para los filtros por estado y sitemap (evita recorrer toda la tabla)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_status_sitemap ON businesses(status, sitemap_url)")
+    conn.close()
 
 def get_pending_urls(status=None, limit=100, sitemap=None):
     """Obtener URLs pendientes para procesar según filtros"""
     conn = connect_db()
     cursor = conn.cursor()
     
-    query = "SELECT url, sitemap_url FROM businesses WHERE 1=1"
+    # Extraer el host de la URL en SQL (texto entre "://" y la siguiente "/");
+    # rowid es el orden de inserción, exista o no una columna id
+    query = (
+        "SELECT url, sitemap_url, rowid AS id, substr(url, instr(url, '://') + 3) AS rest"
+        " FROM businesses WHERE 1=1"
+    )
     params = []
 
     # Filtrar por estado si se proporciona
@@ -71,46 +267,127 @@ def get_pending_urls(status=None, limit=100, sitemap=None):
         query += " AND sitemap_url = ?"
         params.append(sitemap)
     
-    query += f" LIMIT {int(limit)}"
+    # Intercalar dominios: primero la 1ª URL de cada host, luego la 2ª, etc.,
+    # para que cada lote reparta las solicitudes entre hosts distintos
+    query = (
+        "SELECT url, sitemap_url FROM ("
+        " SELECT url, sitemap_url, host, ROW_NUMBER() OVER (PARTITION BY host ORDER BY id) AS rn FROM ("
+        "  SELECT url, sitemap_url, id,"
+        "   CASE WHEN instr(rest, '/') > 0 THEN substr(rest, 1, instr(rest, '/') - 1) ELSE rest END AS host"
+        f"  FROM ({query})"
+        " )"
+        ") ORDER BY rn, host"
+    )
+    query += " LIMIT ?"
+    params.append(int(limit))
     
-    log_message(f"Ejecutando consulta: {query} con parámetros: {params}")
+    log_debug("Ejecutando consulta: %s con parámetros: %s", query, params)
     cursor.execute(query, params)
     urls = cursor.fetchall()
     conn.close()
     
     return urls
 
+@lru_cache(maxsize=1024)
+def get_domain(url):
+    """Host (con puerto) de una URL, sin construir el resultado completo de urlparse"""
+    host = url.split('://', 1)[-1].split('/', 1)[0]
+    return host.split('?', 1)[0].split('#', 1)[0].lower()
+
 def group_urls_by_domain(urls):
     """Agrupar URLs por dominio para controlar la tasa de solicitudes"""
     domain_groups = defaultdict(list)
     for url, sitemap_url in urls:
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc
-        domain_groups[domain].append((url, sitemap_url))
+        domain_groups[get_domain(url)].append((url, sitemap_url))
     return domain_groups
 
 def update_status(url, status, **kwargs):
-    """Actualizar el estado de una URL en la base de datos"""
-    conn = connect_db()
-    cursor = conn.cursor()
+    """Encolar la actualización del estado de una URL para el hilo escritor"""
+    query, fields = STATUS_UPDATES[status]
+    params = (status, *(kwargs.get(field) for field in fields), url)
+    WRITE_Q.put((query, params))
+
+def mark_processing(urls, processed_at):
+    """Encolar el paso a "processing" de todas las URLs de un lote en una sola sentencia"""
+    placeholders = ', '.join('?' * len(urls))
+    query = f"UPDATE businesses SET status = ?, processed_at = ? WHERE url IN ({placeholders})"
+    WRITE_Q.put((query, ("processing", processed_at, *urls)))
+
+def write_batch(conn, pending):
+    """Escribir un lote de actualizaciones en una sola transacción.
     
-    set_clause = "status = ?"
-    params = [status]
+    Si la base de datos está bloqueada (la ruta de Next.js escribe en ella a la vez)
+    se reintenta el lote; si aun así falla, las sentencias se ejecutan una a una para
+    que un error puntual no descarte el resto del lote.
+    """
+    for attempt in range(1, WRITE_RETRIES + 1):
+        try:
+            # Las sentencias iguales consecutivas van en un executemany
+            with conn:
+                for query, group in groupby(pending, key=itemgetter(0)):
+                    conn.executemany(query, [params for _, params in group])
+            return
+        except sqlite3.OperationalError as e:
+            message = str(e)
+            if 'locked' not in message and 'busy' not in message:
+                log_message(f"Error escribiendo {len(pending)} actualizaciones en la base de datos: {message}")
+                break
+            log_message(f"Base de datos bloqueada (intento {attempt}/{WRITE_RETRIES}): {message}")
+            time.sleep(attempt)
+        except sqlite3.Error as e:
+            log_message(f"Error escribiendo {len(pending)} actualizaciones en la base de datos: {str(e)}")
+            break
     
-    # Agregar campos adicionales si se proporcionan
-    for key, value in kwargs.items():
-        set_clause += f", {key} = ?"
-        params.append(value)
+    for query, params in pending:
+        try:
+            with conn:
+                conn.execute(query, params)
+        except sqlite3.Error as e:
+            log_message(f"Error escribiendo una actualización en la base de datos: {str(e)}")
+
+def db_writer():
+    """Hilo escritor único: agrupa las actualizaciones en una transacción por lote"""
+    conn = connect_db(timeout=WRITE_BUSY_TIMEOUT)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
     
-    params.append(url)  # Para la cláusula WHERE
+    pending = []
+    last_flush = time.monotonic()
+    stop = False
+    while not stop:
+        try:
+            item = WRITE_Q.get(timeout=WRITE_FLUSH_INTERVAL)
+        except queue.Empty:
+            item = ()
+        
+        if item is None:
+            stop = True
+        elif item:
+            pending.append(item)
+        
+        now = time.monotonic()
+        if pending and (stop or len(pending) >= WRITE_BATCH_SIZE or now - last_flush >= WRITE_FLUSH_INTERVAL):
+            write_batch(conn, pending)
+            pending = []
+            last_flush = now
     
-    query = f"UPDATE businesses SET {set_clause} WHERE url = ?"
-    cursor.execute(query, params)
-    conn.commit()
     conn.close()
 
+def start_db_writer():
+    """Arrancar el hilo escritor de la base de datos"""
+    writer = threading.Thread(target=db_writer, name='db-writer', daemon=True)
+    writer.start()
+    return writer
+
+def stop_db_writer(writer):
+    """Vaciar la cola de escritura y esperar a que el hilo escritor termine"""
+    WRITE_Q.put(None)
+    writer.join()
+
+@lru_cache(maxsize=None)
 def get_rate_limit_for_domain(domain):
-    """Obtener el límite de tasa para un dominio específico"""
+    """Obtener el límite de tasa para un dominio específico (memorizado por dominio)"""
     # Comprobar si el dominio termina con alguno de los dominios en DOMAIN_RATE_LIMIT
     for key_domain, limit in DOMAIN_RATE_LIMIT.items():
         if domain.endswith(key_domain):
@@ -119,33 +396,111 @@ def get_rate_limit_for_domain(domain):
 
 def wait_for_rate_limit(domain):
     """Esperar si es necesario para cumplir con los límites de tasa por dominio"""
+    rate_limit = get_rate_limit_for_domain(domain)
+    
+    # Calcular el tiempo que debe pasar entre solicitudes (en segundos)
+    delay_needed = 1.0 / rate_limit
+    
+    # Reservar el siguiente turno libre del dominio; el lock solo cubre el cálculo,
+    # no la espera, para que otros workers del mismo dominio puedan reservar el suyo
     with domain_locks[domain]:
-        rate_limit = get_rate_limit_for_domain(domain)
-        
-        # Calcular el tiempo que debe pasar entre solicitudes (en segundos)
-        delay_needed = 1.0 / rate_limit
-        
-        # Obtener el tiempo transcurrido desde la última solicitud
-        last_request = last_request_time[domain]
-        now = time.time()
-        time_since_last_request = now - last_request
-        
-        # Si no ha pasado suficiente tiempo, esperar
-        if time_since_last_request < delay_needed:
-            wait_time = delay_needed - time_since_last_request
-            # Añadir jitter (variación aleatoria) para evitar sincronización
-            jitter = random.uniform(0.1, 0.5)
-            total_wait = wait_time + jitter
-            log_message(f"Esperando {total_wait:.2f}s antes de solicitar {domain} (límite: {rate_limit}/s)")
-            time.sleep(total_wait)
-        
-        # Actualizar el tiempo de la última solicitud
-        last_request_time[domain] = time.time()
+        now = time.monotonic()
+        slot = max(now, next_allowed_time[domain])
+        next_allowed_time[domain] = slot + delay_needed
+    
+    # Si el turno aún no ha llegado, esperar
+    wait_time = slot - now
+    if wait_time > 0:
+        # Añadir jitter (variación aleatoria) para evitar sincronización
+        jitter = random.uniform(0.1, 0.5)
+        total_wait = wait_time + jitter
+        log_debug("Esperando %.2fs antes de solicitar %s (límite: %s/s)", total_wait, domain, rate_limit)
+        time.sleep(total_wait)
+
+def parse_html(body, encoding=None):
+    """Construir el árbol lxml de una página a partir de sus bytes"""
+    parser = None
+    if encoding:
+        try:
+            parser = lxml.html.HTMLParser(encoding=encoding)
+        except LookupError:
+            parser = None  # Charset desconocido: dejar que lxml lo detecte
+    tree = lxml.html.document_fromstring(body, parser=parser)
+    
+    # Sin charset en la cabecera ni en <meta>, lxml asume ISO-8859-1: si los
+    # bytes son UTF-8 válido, volver a parsear como UTF-8 (solo en ese caso)
+    if parser is None and tree.getroottree().docinfo.encoding == 'ISO-8859-1' and not body.isascii():
+        try:
+            body.decode('utf-8')
+        except UnicodeDecodeError:
+            return tree
+        tree = lxml.html.document_fromstring(body, parser=lxml.html.HTMLParser(encoding='utf-8'))
+    return tree
+
+def short_text(elem, max_len=MAX_ADDRESS_LEN):
+    """Texto de un elemento sin espacios extremos, o None si alcanza max_len caracteres.
+    
+    Deja de recorrer el subárbol en cuanto se supera el límite, en lugar de
+    concatenar todo el texto de contenedores enormes para luego descartarlo.
+    """
+    text = ''
+    for chunk in elem.itertext():
+        text += chunk
+        if len(text.strip()) >= max_len:
+            return None
+    return text.strip()
+
+def find_full_addresses(text, window=MAX_ADDRESS_LEN * 2):
+    """Direcciones completas de text, buscadas por ventanas solapadas de `window` caracteres.
+    
+    Los patrones tienen cuantificadores solapados y sobre un texto largo el
+    coste es cuadrático. Como una dirección útil mide menos de MAX_ADDRESS_LEN,
+    basta con recorrer ventanas acotadas y aceptar en cada una solo las
+    coincidencias que empiezan en su primera mitad (las demás las ve la siguiente).
+    """
+    step = window // 2
+    for start in range(0, len(text), step):
+        for match in FULL_ADDRESS_RE.finditer(text, start, start + window):
+            if match.start() >= start + step:
+                break
+            # Número cortado por el inicio de la ventana: ya lo cubre la anterior
+            if match.start() == start and start > 0 and text[start - 1].isdigit():
+                continue
+            yield match.group(0)
 
-def extract_info(url):
+def schema_address(addr):
+    """Componer una dirección a partir de un objeto PostalAddress de schema.org"""
+    parts = [addr[key] for key in SCHEMA_ADDRESS_KEYS if key in addr]
+    country = addr.get('addressCountry')
+    if isinstance(country, dict):
+        country = country.get('name')
+    if isinstance(country, str):
+        parts.append(country)
+    return ', '.join(part for part in parts if part)
+
+def schema_addresses(data):
+    """Recorrer un documento JSON-LD (listas, @graph, objetos anidados) y devolver sus direcciones.
+    
+    Usa una pila en lugar de recursión y respeta el orden del documento.
+    """
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            addr = node.get('address')
+            for item in (addr if isinstance(addr, list) else [addr]):
+                if isinstance(item, dict):
+                    full_addr = schema_address(item)
+                    if full_addr:
+                        yield full_addr
+            stack.extend(reversed([value for key, value in node.items() if key != 'address' and isinstance(value, (dict, list))]))
+
+def extract_info(url, domain=None):
     """Extraer información de una página web"""
-    parsed_url = urlparse(url)
-    domain = parsed_url.netloc
+    if domain is None:
+        domain = get_domain(url)
     
     # Esperar según la limitación de tasa para este dominio
     wait_for_rate_limit(domain)
@@ -159,236 +514,192 @@ def extract_info(url):
         'Mozilla/5.0 (iPad; CPU OS 14_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Mobile/15E148 Safari/604.1'
     ]
     
-    headers = {
-        'User-Agent': random.choice(user_agents),
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Referer': 'https://www.google.com/',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Cache-Control': 'max-age=0'
-    }
-    
-    for attempt in range(MAX_RETRIES):
+    headers = {'User-Agent': random.choice(user_agents)}
+    
+    try:
+        log_debug("Intentando acceder a: %s", url)
+        
+        # Los reintentos con retraso exponencial los gestiona el adaptador de SESSION
+        response = SESSION.get(url, headers=headers, timeout=TIMEOUT, stream=True)
         try:
-            log_message(f"Intentando acceder a: {url}")
-            
-            # Añadir un retraso exponencial entre reintentos
-            if attempt > 0:
-                backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                log_message(f"Reintento {attempt+1}/{MAX_RETRIES} para {url}, esperando {backoff_time:.2f}s...")
-                time.sleep(backoff_time)
-            
-            response = requests.get(url, headers=headers, timeout=TIMEOUT)
             response.raise_for_status()
             
-            # Introducir un pequeño retraso después de cada solicitud exitosa
-            time.sleep(random.uniform(0.5, 1.5))
+            # Descartar PDFs, imágenes y otros binarios antes de descargarlos
+            content_type = response.headers.get('Content-Type', '').lower()
+            if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+                log_message(f"Contenido no HTML en {url}: {content_type}")
+                return {'url': url, 'error': f"Tipo de contenido no soportado: {content_type}"}
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extraer título
-            title = None
-            title_tag = soup.find('title')
-            if title_tag:
-                title = title_tag.text.strip()
-                log_message(f"Título extraído: {title[:50]}...")
-            
-            # Extraer descripción
-            description = None
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc and meta_desc.get('content'):
-                description = meta_desc.get('content').strip()
-                log_message(f"Descripción extraída: {description[:50]}...")
-            
-            # Extraer correos electrónicos
-            email = None
-            emails = re.findall(EMAIL_REGEX, response.text)
-            if emails:
-                # Filtrar correos que probablemente sean genéricos o plantillas
-                filtered_emails = [e for e in emails if not any(x in e for x in ['example', 'user', 'domain'])]
-                if filtered_emails:
-                    email = filtered_emails[0]  # Tomar el primer correo válido
-                    log_message(f"Email extraído: {email}")
-            
-            # Extracción mejorada de dirección
-            address = None
-            address_candidates = []
-            
-            # 1. Buscar en elementos con clases o IDs comunes para direcciones
-            address_elements = soup.select('.address, #address, .location, #location, .contact-address, [itemprop="address"], .footer-address, .contact-info address, .store-address')
-            for elem in address_elements:
-                txt = elem.get_text().strip()
-                if txt and len(txt) > 10 and len(txt) < 200:  # Una dirección típica
+            # Leer como máximo MAX_BYTES del cuerpo
+            body = response.raw.read(MAX_BYTES, decode_content=True)
+        finally:
+            response.close()
+        if len(body) < MIN_BYTES:
+            # Página válida pero sin datos útiles: se completa con los campos vacíos
+            log_message(f"Contenido demasiado corto en {url}: {len(body)} bytes, sin datos que extraer")
+            return {'url': url, 'title': None, 'description': None, 'email': None, 'address': None}
+        charset = CHARSET_RE.search(content_type)
+        
+        # Introducir un pequeño retraso después de cada solicitud exitosa
+        time.sleep(random.uniform(0.5, 1.5))
+        
+        tree = parse_html(body, charset.group(1) if charset else None)
+        
+        # Extraer título
+        title = None
+        title_tag = TITLE_XPATH(tree)
+        if title_tag:
+            title = title_tag[0].text_content().strip()
+            log_debug("Título extraído: %.50s...", title)
+        
+        # Extraer descripción
+        description = None
+        meta_desc = DESCRIPTION_XPATH(tree)
+        if meta_desc and meta_desc[0].get('content'):
+            description = meta_desc[0].get('content').strip()
+            log_debug("Descripción extraída: %.50s...", description)
+        
+        # Extraer correos electrónicos
+        email = None
+        page_text = '\n'.join(PAGE_TEXT_XPATH(tree))
+        # Tomar el primer correo válido, descartando los genéricos o de plantilla,
+        # y dejar de buscar en cuanto aparece
+        for match in EMAIL_RE.finditer(page_text):
+            if not GENERIC_EMAIL_RE.search(match.group(0)):
+                email = match.group(0)
+                log_debug("Email extraído: %s", email)
+                break
+        
+        # Extracción mejorada de dirección
+        address = None
+        address_candidates = []
+        
+        # 1. Buscar en elementos con clases o IDs comunes para direcciones
+        address_elements = ADDRESS_XPATH(tree)
+        for elem in address_elements:
+            txt = short_text(elem)
+            if txt and len(txt) > 10:  # Una dirección típica
+                address_candidates.append(txt)
+                log_debug("Candidato de dirección encontrado en elemento específico: %.50s...", txt)
+        
+        # 2. Buscar en schema.org markup
+        schema_scripts = SCHEMA_XPATH(tree)
+        for script in schema_scripts:
+            try:
+                raw = script.text or ''
+                # Solo interesan los bloques con dirección: evitar parsear el resto
+                if '"address"' not in raw:
+                    continue
+                for full_addr in schema_addresses(json_loads(raw)):
+                    if full_addr not in address_candidates:
+                        address_candidates.append(full_addr)
+                        log_debug("Candidato de dirección encontrado en schema.org: %s", full_addr)
+            except (ValueError, TypeError) as e:
+                # JSON inválido (json/orjson.JSONDecodeError son ValueError) o valores con tipos inesperados
+                log_message(f"Error procesando schema.org: {str(e)}")
+        
+        # 3. Si no encontramos nada en clases específicas, buscar patrones de dirección
+        if not address_candidates:
+            # Patrones de dirección completa sobre todo el texto, por ventanas acotadas
+            for txt in find_full_addresses(page_text):
+                txt = txt.strip()
+                if 10 < len(txt) < MAX_ADDRESS_LEN and txt not in address_candidates:
                     address_candidates.append(txt)
-                    log_message(f"Candidato de dirección encontrado en elemento específico: {txt[:50]}...")
-            
-            # 2. Buscar en schema.org markup
-            schema_scripts = soup.find_all('script', type='application/ld+json')
-            for script in schema_scripts:
-                try:
-                    data = json.loads(script.string)
-                    if isinstance(data, list):
-                        for item in data:
-                            if isinstance(item, dict) and 'address' in item:
-                                addr = item['address']
-                                if isinstance(addr, dict):
-                                    addr_parts = []
-                                    if 'streetAddress' in addr:
-                                        addr_parts.append(addr['streetAddress'])
-                                    if 'addressLocality' in addr:
-                                        addr_parts.append(addr['addressLocality'])
-                                    if 'addressRegion' in addr:
-                                        addr_parts.append(addr['addressRegion'])
-                                    if 'postalCode' in addr:
-                                        addr_parts.append(addr['postalCode'])
-                                    if 'addressCountry' in addr:
-                                        if isinstance(addr['addressCountry'], str):
-                                            addr_parts.append(addr['addressCountry'])
-                                        elif isinstance(addr['addressCountry'], dict) and 'name' in addr['addressCountry']:
-                                            addr_parts.append(addr['addressCountry']['name'])
-                                    
-                                    if addr_parts:
-                                        full_addr = ', '.join(addr_parts)
-                                        address_candidates.append(full_addr)
-                                        log_message(f"Candidato de dirección encontrado en schema.org: {full_addr}")
-                    elif isinstance(data, dict) and 'address' in data:
-                        addr = data['address']
-                        if isinstance(addr, dict):
-                            addr_parts = []
-                            if 'streetAddress' in addr:
-                                addr_parts.append(addr['streetAddress'])
-                            if 'addressLocality' in addr:
-                                addr_parts.append(addr['addressLocality'])
-                            if 'addressRegion' in addr:
-                                addr_parts.append(addr['addressRegion'])
-                            if 'postalCode' in addr:
-                                addr_parts.append(addr['postalCode'])
-                            if 'addressCountry' in addr:
-                                if isinstance(addr['addressCountry'], str):
-                                    addr_parts.append(addr['addressCountry'])
-                                elif isinstance(addr['addressCountry'], dict) and 'name' in addr['addressCountry']:
-                                    addr_parts.append(addr['addressCountry']['name'])
-                            
-                            if addr_parts:
-                                full_addr = ', '.join(addr_parts)
-                                address_candidates.append(full_addr)
-                                log_message(f"Candidato de dirección encontrado en schema.org: {full_addr}")
-                except Exception as e:
-                    log_message(f"Error procesando schema.org: {str(e)}")
-            
-            # 3. Si no encontramos nada en clases específicas, buscar patrones de dirección
-            if not address_candidates:
-                # Patrones comunes de direcciones (buscar cosas que se parezcan a direcciones)
-                address_patterns = [
-                    r'\d+\s+[A-Za-z]+(?:\s+[A-Za-z]+)*\s+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr|Court|Ct|Plaza|Square|Sq|Highway|Hwy|Route|RT|Parkway|Pkwy|Circle|Cir|Terrace|Ter|Place|Pl),?\s+[A-Za-z\s]+,?\s+[A-Z]{2}\s+\d{5}(-\d{4})?',  # US Style
-                    r'\d+\s+[A-Za-z\s]+,\s+[A-Za-z\s]+,\s+[A-Z]{2}\s+\d{5}(-\d{4})?',  # Simplified US
-                    r'\d+\s+[A-Za-z\s]+,\s+[A-Za-z\s]+,\s+[A-Z|a-z]{1,2}\d{1,2}\s+\d{1,2}[A-Z|a-z]{2}',  # UK Postcode
-                    r'calle|avenida|av\.|carrera|cra\.|carrer|via|vía|paseo|plaza|boulevard|blvd\.', # Palabras clave en español
-                    r'rua|avenida|av\.|praça|alameda|estrada|rodovia',  # Palabras clave en portugués
-                ]
-                
-                # Buscar en párrafos que podrían contener direcciones
-                for p in soup.find_all(['p', 'div', 'span']):
-                    txt = p.get_text().strip()
+                    log_debug("Candidato de dirección encontrado en el texto: %.50s...", txt)
+        
+        if not address_candidates:
+            # Buscar en párrafos de las zonas de contacto que podrían contener direcciones
+            # (las direcciones completas del resto de la página ya las cubre el paso 3)
+            seen = set()
+            for section in ADDRESS_HINT_XPATH(tree):
+                for p in section.iter('p', 'div', 'span', 'address'):
+                    if p in seen:
+                        continue
+                    seen.add(p)
+                    txt = short_text(p)
                     # Verificar tamaño razonable para dirección
-                    if len(txt) > 10 and len(txt) < 200:
+                    if txt and len(txt) > 10:
                         # Verificar si coincide con alguno de los patrones
-                        for pattern in address_patterns:
-                            if re.search(pattern, txt, re.IGNORECASE):
-                                address_candidates.append(txt)
-                                log_message(f"Candidato de dirección encontrado por patrón: {txt[:50]}...")
-                                break
-                
-                # Buscar específicamente en secciones de contacto
-                contact_sections = soup.select('.contact, #contact, .contact-info, #contact-info, .contacto, #contacto, footer')
-                for section in contact_sections:
-                    paragraphs = section.find_all(['p', 'div', 'span', 'address'])
-                    for p in paragraphs:
-                        txt = p.get_text().strip()
-                        if len(txt) > 10 and len(txt) < 200:
-                            # Verificar si tiene números y algunas palabras clave
-                            if re.search(r'\d+', txt) and any(re.search(kw, txt, re.IGNORECASE) for kw in ['address', 'location', 'street', 'avenue', 'calle', 'avenida', 'rua']):
-                                address_candidates.append(txt)
-                                log_message(f"Candidato de dirección encontrado en sección de contacto: {txt[:50]}...")
-            
-            # Evaluar candidatos y elegir la mejor dirección
-            if address_candidates:
-                # Primero intentar encontrar una dirección que tenga un código postal
-                for cand in address_candidates:
-                    # Verificar si tiene formato de código postal (números y letras específicas)
-                    if re.search(r'\b\d{5}(-\d{4})?\b|\b[A-Z]{1,2}\d{1,2}\s+\d{1,2}[A-Z]{2}\b', cand):
-                        address = cand
-                        log_message(f"Dirección seleccionada con código postal: {address[:50]}...")
-                        break
-                
-                # Si no hay con código postal, elegir la que parece más completa (más números y comas)
-                if not address:
-                    # Ordenar por "complejidad" - más comas y números suelen indicar direcciones más completas
-                    address_candidates.sort(key=lambda x: (x.count(',') + len(re.findall(r'\d+', x))), reverse=True)
-                    address = address_candidates[0]
-                    log_message(f"Dirección seleccionada por complejidad: {address[:50]}...")
-            
-            # Construir resultado y devolver
-            result = {
-                'url': url,
-                'title': title,
-                'description': description,
-                'email': email,
-                'address': address
-            }
+                        if ADDRESS_RE.search(txt):
+                            address_candidates.append(txt)
+                            log_debug("Candidato de dirección encontrado por patrón: %.50s...", txt)
             
-            log_message(f"Extraído con éxito para {url}: título=✓, descripción={'✓' if description else '✗'}, email={'✓' if email else '✗'}, dirección={'✓' if address else '✗'}")
-            
-            return result
+            # Buscar específicamente en secciones de contacto
+            contact_sections = CONTACT_XPATH(tree)
+            for section in contact_sections:
+                paragraphs = section.iterdescendants('p', 'div', 'span', 'address')
+                for p in paragraphs:
+                    txt = short_text(p)
+                    if txt and len(txt) > 10:
+                        # Verificar si tiene números y algunas palabras clave
+                        if DIGIT_RE.search(txt) and CONTACT_KW_RE.search(txt):
+                            address_candidates.append(txt)
+                            log_debug("Candidato de dirección encontrado en sección de contacto: %.50s...", txt)
+        
+        # Evaluar candidatos y elegir la mejor dirección
+        if address_candidates:
+            # Primero intentar encontrar una dirección que tenga un código postal
+            for cand in address_candidates:
+                # Verificar si tiene formato de código postal (números y letras específicas)
+                if POSTAL_RE.search(cand):
+                    address = cand
+                    log_debug("Dirección seleccionada con código postal: %.50s...", address)
+                    break
             
-        except requests.RequestException as e:
-            if attempt == MAX_RETRIES - 1:
-                log_message(f"Error final accediendo a {url}: {str(e)}")
-                return {'url': url, 'error': str(e)}
-            else:
-                log_message(f"Intento {attempt+1} fallido para {url}: {str(e)}. Reintentando...")
-        except Exception as e:
-            log_message(f"Error procesando {url}: {str(e)}")
-            return {'url': url, 'error': str(e)}
-    
-    return {'url': url, 'error': 'Máximo de reintentos alcanzado'}
-
-def process_url(url_data):
-    """Procesar una URL y actualizar la base de datos"""
+            # Si no hay con código postal, elegir la que parece más completa (más números y comas)
+            if not address:
+                # Elegir la de mayor "complejidad" - más comas y números suelen indicar direcciones más completas
+                address = max(address_candidates, key=lambda x: x.count(',') + sum(1 for _ in DIGIT_RE.finditer(x)))
+                log_debug("Dirección seleccionada por complejidad: %.50s...", address)
+        
+        # Construir resultado y devolver
+        result = {
+            'url': url,
+            'title': title,
+            'description': description,
+            'email': email,
+            'address': address
+        }
+        
+        log_message(f"Extraído con éxito para {url}: título=✓, descripción={'✓' if description else '✗'}, email={'✓' if email else '✗'}, dirección={'✓' if address else '✗'}")
+        
+        return result
+        
+    except requests.RequestException as e:
+        log_message(f"Error final accediendo a {url}: {str(e)}")
+        return {'url': url, 'error': str(e)}
+    except Exception as e:
+        log_message(f"Error procesando {url}: {str(e)}")
+        return {'url': url, 'error': str(e)}
+
+def process_url(url_data, processed_at, domain=None):
+    """Procesar una URL y actualizar la base de datos con la marca de tiempo del lote"""
     url, sitemap_url = url_data
     
-    # Actualizar estado a "processing"
-    with LOCK:
-        update_status(url, "processing", processed_at=datetime.now().isoformat())
-    
     # Extraer información
-    log_message(f"Procesando URL: {url}")
-    result = extract_info(url)
+    log_debug("Procesando URL: %s", url)
+    result = extract_info(url, domain)
     
     # Manejar resultado
     if 'error' in result:
-        with LOCK:
-            update_status(
-                url, 
-                "error",
-                error_message=result['error'],
-                processed_at=datetime.now().isoformat()
-            )
+        update_status(
+            url, 
+            "error",
+            error_message=result['error'],
+            processed_at=processed_at
+        )
         send_sse_event('FAIL', {'url': url, 'error': result['error']})
         return False
     else:
-        with LOCK:
-            update_status(
-                url,
-                "completed",
-                title=result.get('title', 'Sin título'),
-                description=result.get('description'),
-                email=result.get('email'),
-                address=result.get('address'),
-                processed_at=datetime.now().isoformat()
-            )
+        update_status(
+            url,
+            "completed",
+            title=result.get('title', 'Sin título'),
+            description=result.get('description'),
+            email=result.get('email'),
+            address=result.get('address'),
+            processed_at=processed_at
+        )
         send_sse_event('SUCCESS', result)
         return True
 
@@ -397,34 +708,49 @@ def process_batch(batch, args, progress_callback=None):
     successful = 0
     failed = 0
     
+    # Una sola marca de tiempo para todas las filas del lote
+    processed_at = datetime.now().isoformat()
+    
+    # Marcar el lote completo como "processing" antes de empezar
+    mark_processing([url for url, _ in batch], processed_at)
+    
     # Agrupar las URLs por dominio
     domain_groups = group_urls_by_domain(batch)
     
-    # Procesar cada grupo de dominios con su propio límite de tasa
+    # Usar menos workers simultáneos para dominios con límites más estrictos
+    domain_slots = {}
     for domain, urls in domain_groups.items():
-        log_message(f"Procesando grupo de {len(urls)} URLs para dominio: {domain}")
-        
-        # Usar menos workers para dominios específicos con límites más estrictos
         workers = 1 if "ueniweb.com" in domain else min(args.workers, 2)
-        log_message(f"Usando {workers} workers para el dominio {domain}")
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_url = {executor.submit(process_url, url_data): url_data for url_data in urls}
-            for future in concurrent.futures.as_completed(future_to_url):
-                url_data = future_to_url[future]
-                try:
-                    if future.result():
-                        successful += 1
-                    else:
-                        failed += 1
-                    
-                    if progress_callback:
-                        progress_callback(successful, failed)
-                except Exception as e:
-                    log_message(f"Error procesando {url_data[0]}: {str(e)}")
+        domain_slots[domain] = threading.Semaphore(workers)
+        log_debug("Procesando grupo de %d URLs para dominio: %s (%d workers)", len(urls), domain, workers)
+    
+    def process_with_slot(domain, url_data):
+        with domain_slots[domain]:
+            return process_url(url_data, processed_at, domain)
+    
+    # Un solo pool para todo el lote: los dominios se procesan a la vez en lugar
+    # de uno detrás de otro, y cada uno respeta su propio límite de concurrencia
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+        future_to_url = {
+            executor.submit(process_with_slot, domain, url_data): url_data
+            for domain, urls in domain_groups.items()
+            for url_data in urls
+        }
+        for future in concurrent.futures.as_completed(future_to_url):
+            url_data = future_to_url[future]
+            try:
+                if future.result():
+                    successful += 1
+                else:
                     failed += 1
-                    if progress_callback:
-                        progress_callback(successful, failed)
+                
+                if progress_callback:
+                    progress_callback(successful, failed)
+            except Exception as e:
+                log_message(f"Error procesando {url_data[0]}: {str(e)}")
+                failed += 1
+                if progress_callback:
+                    progress_callback(successful, failed)
     
     return successful, failed
 
@@ -436,14 +762,19 @@ def main():
     parser.add_argument('--workers', type=int, default=3, help='Número máximo de trabajadores paralelos')
     parser.add_argument('--batch-size', type=int, default=5, help='Tamaño del lote para procesar')
     parser.add_argument('--delay', type=float, default=1.0, help='Retraso entre lotes en segundos')
+    parser.add_argument('--verbose', action='store_true', help='Mostrar mensajes de detalle por URL')
     
     args = parser.parse_args()
+    global VERBOSE
+    VERBOSE = args.verbose
+    start_output_flusher()
     
     # Imprimir parámetros para verificación
     log_message(f"Iniciando con parámetros: status={args.status}, limit={args.limit}, sitemap={args.sitemap}")
     log_message(f"Configuración: workers={args.workers}, batch-size={args.batch_size}, delay={args.delay}")
     
     # Obtener URLs para procesar
+    ensure_indexes()
     urls = get_pending_urls(status=args.status, limit=args.limit, sitemap=args.sitemap)
     
     if not urls:
@@ -469,26 +800,31 @@ def main():
     
     # Mostrar la distribución de URLs por dominio
     for domain, domain_urls in domain_groups.items():
-        log_message(f"Dominio {domain}: {len(domain_urls)} URLs")
+        log_debug("Dominio %s: %d URLs", domain, len(domain_urls))
     
-    # Procesar las URLs en lotes pequeños
-    for i in range(0, len(urls), args.batch_size):
-        batch = urls[i:i + args.batch_size]
-        log_message(f"Procesando lote {i//args.batch_size + 1}/{(len(urls) + args.batch_size - 1)//args.batch_size} ({len(batch)} URLs)")
-        
-        def progress_callback(successful, failed):
-            progress = (i + successful + failed) / len(urls) * 100
-            log_message(f"Progreso: {progress:.1f}% - Éxito: {total_successful + successful}, Fallos: {total_failed + failed}")
-        
-        success, fail = process_batch(batch, args, progress_callback)
-        total_successful += success
-        total_failed += fail
-        
-        # Descansar entre lotes para evitar sobrecarga
-        if i + args.batch_size < len(urls):
-            delay = args.delay + random.uniform(0.5, 2.0)  # Añadir variabilidad
-            log_message(f"Descansando {delay:.2f}s antes del siguiente lote...")
-            time.sleep(delay)
+    # Procesar las URLs en lotes pequeños; las escrituras en la base de datos
+    # las hace un único hilo escritor
+    writer = start_db_writer()
+    try:
+        for i in range(0, len(urls), args.batch_size):
+            batch = urls[i:i + args.batch_size]
+            log_message(f"Procesando lote {i//args.batch_size + 1}/{(len(urls) + args.batch_size - 1)//args.batch_size} ({len(batch)} URLs)")
+            
+            def progress_callback(successful, failed):
+                progress = (i + successful + failed) / len(urls) * 100
+                log_message(f"Progreso: {progress:.1f}% - Éxito: {total_successful + successful}, Fallos: {total_failed + failed}")
+            
+            success, fail = process_batch(batch, args, progress_callback)
+            total_successful += success
+            total_failed += fail
+            
+            # Descansar entre lotes para evitar sobrecarga
+            if i + args.batch_size < len(urls):
+                delay = args.delay + random.uniform(0.5, 2.0)  # Añadir variabilidad
+                log_message(f"Descansando {delay:.2f}s antes del siguiente lote...")
+                time.sleep(delay)
+    finally:
+        stop_db_writer(writer)
     
     elapsed_time = time.time() - start_time
     log_message(f"Procesamiento completado en {elapsed_time:.2f} segundos.")
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import asyncio
+import hashlib
 import json
+import logging
 import os
 import re
 import signal
@@ -8,24 +10,103 @@ import sys
 import time
 import urllib.parse
 import ssl
-from typing import Dict, List, Set, Any, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from collections import Counter
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List, Set, Any, Optional, Tuple, Union
 
 import aiohttp
 import argparse
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 from rich.console import Console
 from urllib.parse import urlparse, urljoin
 
+# orjson is optional: faster C serializer, with the json module as fallback
+try:
+    import orjson
+
+    def json_dumps(data: Any, indent: bool = False) -> bytes:
+        """Serialize to UTF-8 JSON bytes."""
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+except ImportError:
+    def json_dumps(data: Any, indent: bool = False) -> bytes:
+        """Serialize to UTF-8 JSON bytes."""
+        return json.dumps(data, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
 # Initialize console for output
 console = Console(stderr=True)
 
-# Dictionary to store extracted business data
-businesses_data = {}
+# Per-URL messages go through logging (cheap when disabled); the console keeps
+# the run summary and progress lines
+logger = logging.getLogger(__name__)
+
+# Normalized URLs already processed in this run
+seen_urls: Set[str] = set()
+
+# Digest of each page body already extracted -> its URL (many hostnames serve the same template page)
+seen_page_digests: Dict[bytes, str] = {}
+
+# Seconds to wait for data on a socket before giving up on a request
+REQUEST_TIMEOUT = 30
+
+# Maximum bytes read from a business page; the rest of the body is ignored
+MAX_PAGE_BYTES = 2_000_000
+
+# Maximum nesting of sitemap indexes to follow
+MAX_SITEMAP_DEPTH = 4
+
+# Sitemap protocol tags, with or without the sitemap namespace ('{}' matches
+# un-namespaced elements only); extension elements such as <image:loc> are not page URLs
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+SITEMAP_LOC_TAGS = (SITEMAP_NS + 'loc', '{}loc')
+SITEMAP_URL_TAGS = {SITEMAP_NS + 'url', 'url'}
+SITEMAP_SITEMAP_TAGS = {SITEMAP_NS + 'sitemap', 'sitemap'}
 
 # Exit flag for graceful shutdown
 exit_flag = False
 
 
+def _class_test(name: str) -> str:
+    """XPath predicate equivalent to the CSS selector .name"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Precompiled patterns for emails and address fallbacks
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+ADDRESS_PATTERNS = [
+    r'\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr|Court|Ct|Place|Pl|Terrace|Ter)[\s,]+[A-Za-z\s]+(?:,\s*[A-Z]{2})?\s*\d{5}(?:-\d{4})?',
+    r'(?:calle|av\.|avenida|carrera|autopista|paseo)\s+[A-Za-z0-9\s]+(?:,\s*[A-Za-z\s]+)?(?:,\s*[A-Za-z\s]+)?',
+]
+# Single alternation so the page is scanned once for all address styles
+ADDRESS_RE = re.compile('|'.join(f'(?:{p})' for p in ADDRESS_PATTERNS), re.IGNORECASE)
+
+# Stop collecting address candidates once one of this length is found
+GOOD_ADDRESS_LEN = 30
+# Maximum number of regex matches collected as address candidates
+MAX_ADDRESS_MATCHES = 8
+
+# Markup and whitespace, ignored when comparing page bodies
+TAG_OR_SPACE_RE = re.compile(r'\s+|<[^>]+>')
+
+# Precompiled XPath lookups for business pages (equivalent to the CSS selectors)
+TITLE_XPATH = etree.XPath("(//title)[1]")
+META_DESCRIPTION_XPATH = etree.XPath("//meta[@name='description' or @property='og:description']")
+# Single expression for .address, #address, [itemprop="address"], .contact-info,
+# .location and .footer, so the document is walked once (matches in document order)
+ADDRESS_XPATH = etree.XPath("//*[" + " or ".join([
+    _class_test('address'), "@id='address'", "@itemprop='address'",
+    _class_test('contact-info'), _class_test('location'), _class_test('footer'),
+]) + "]")
+# Visible body text (no scripts or styles) plus mailto: links, in document order
+PAGE_TEXT_XPATH = etree.XPath(
+    "//body//text()[not(ancestor::script) and not(ancestor::style)]"
+    " | //a[starts-with(@href, 'mailto:')]/@href",
+    smart_strings=False
+)
+
+
 def signal_handler(sig, frame):
     """Handle Ctrl+C gracefully."""
     global exit_flag
@@ -36,77 +117,128 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)
 
 
+@lru_cache(maxsize=65536)
+def _cached_urlparse(url: str) -> Tuple[str, str, str]:
+    """Return (scheme, netloc, path) of a URL, memoized across calls."""
+    parsed = urlparse(url)
+    return parsed.scheme, parsed.netloc, parsed.path
+
+
+@lru_cache(maxsize=65536)
 def normalize_url(url: str) -> str:
     """Normalize URL to prevent duplicates."""
-    parsed = urlparse(url)
+    scheme, netloc, path = _cached_urlparse(url)
     
     # Remove trailing slash
-    path = parsed.path
     if path.endswith("/") and len(path) > 1:
         path = path[:-1]
         
     # Ensure scheme is set
-    scheme = parsed.scheme or "https"
+    scheme = scheme or "https"
     
     # Rebuild URL without query params or fragments
-    normalized = f"{scheme}://{parsed.netloc}{path}"
+    normalized = f"{scheme}://{netloc}{path}"
     return normalized
 
 
-async def fetch_url(url: str, session: aiohttp.ClientSession, timeout: int = 30) -> Optional[str]:
-    """Fetch URL content with error handling."""
+async def fetch_url(url: str, session: aiohttp.ClientSession, timeout: Optional[int] = None,
+                    raw: bool = False) -> Optional[Union[str, bytes]]:
+    """Fetch URL content with error handling (session timeouts apply unless overridden).
+
+    With raw=True the undecoded response body is returned as bytes.
+    """
     try:
-        async with session.get(url, timeout=timeout, ssl=False) as response:
+        kwargs = {'timeout': aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+        async with session.get(url, ssl=False, **kwargs) as response:
             if response.status == 200:
-                return await response.text()
+                if raw:
+                    return await response.read()
+                return await read_text(response, MAX_PAGE_BYTES)
             else:
-                console.print(f"[yellow]Warning:[/] {url} returned status {response.status}")
+                logger.warning("%s returned status %s", url, response.status)
                 return None
     except Exception as e:
-        console.print(f"[yellow]Warning:[/] Failed to fetch {url}: {e}")
+        logger.warning("Failed to fetch %s: %s", url, e)
         return None
 
 
-async def process_sitemap(sitemap_url: str, session: aiohttp.ClientSession) -> Set[str]:
-    """Process a sitemap and extract URLs."""
-    console.print(f"[cyan]Processing sitemap:[/] {sitemap_url}")
+async def read_text(response: aiohttp.ClientResponse, max_bytes: int) -> str:
+    """Read at most max_bytes of a response body and decode it."""
+    chunks = []
+    total = 0
+    async for chunk in response.content.iter_chunked(65536):
+        chunks.append(chunk)
+        total += len(chunk)
+        if total >= max_bytes:
+            break
+    body = b''.join(chunks)[:max_bytes]
+    try:
+        return body.decode(response.charset or 'utf-8', errors='replace')
+    except LookupError:
+        # Unknown charset in the Content-Type header
+        return body.decode('utf-8', errors='replace')
+
+
+async def process_sitemap(sitemap_url: str, session: aiohttp.ClientSession, depth: int = 0) -> Set[str]:
+    """Process a sitemap and extract URLs, fetching child sitemaps concurrently."""
+    logger.debug("Processing sitemap: %s", sitemap_url)
     
-    content = await fetch_url(sitemap_url, session)
+    content = await fetch_url(sitemap_url, session, raw=True)
     if not content:
         return set()
     
     urls = set()
-    soup = BeautifulSoup(content, 'xml')
+    sub_sitemap_urls = []
+    
+    # Stream the sitemap <loc> elements instead of building the whole tree;
+    # the parent tag tells a sitemap index entry from a page URL, and locs under any
+    # other parent (e.g. inside <image:image>) are skipped
+    try:
+        for _, loc_tag in etree.iterparse(BytesIO(content), events=('end',), tag=SITEMAP_LOC_TAGS, recover=True):
+            parent = loc_tag.getparent()
+            if loc_tag.text and parent is not None:
+                if parent.tag in SITEMAP_SITEMAP_TAGS:
+                    sub_sitemap_urls.append(loc_tag.text.strip())
+                elif parent.tag in SITEMAP_URL_TAGS:
+                    urls.add(loc_tag.text.strip())
+            # Release the entries already handled
+            loc_tag.clear()
+            if parent is not None:
+                while parent.getprevious() is not None:
+                    del parent.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        logger.warning("Could not parse sitemap %s: %s", sitemap_url, e)
     
     # Check if it's a sitemap index
-    sitemap_tags = soup.find_all('sitemap')
-    if sitemap_tags:
+    if sub_sitemap_urls:
         # It's a sitemap index, process each sitemap
-        for sitemap_tag in sitemap_tags:
-            loc_tag = sitemap_tag.find('loc')
-            if loc_tag and loc_tag.string:
-                sub_sitemap_url = loc_tag.string.strip()
-                if exit_flag:
-                    break
-                sub_urls = await process_sitemap(sub_sitemap_url, session)
-                urls.update(sub_urls)
-    else:
-        # It's a regular sitemap, extract URLs
-        url_tags = soup.find_all('url')
-        for url_tag in url_tags:
-            loc_tag = url_tag.find('loc')
-            if loc_tag and loc_tag.string:
-                page_url = loc_tag.string.strip()
-                urls.add(page_url)
+        if depth >= MAX_SITEMAP_DEPTH:
+            logger.warning("Sitemap nesting too deep, skipping %s", sitemap_url)
+            return set()
+        if not exit_flag:
+            # Fetch all child sitemaps at once; the connector bounds the open connections
+            results = await asyncio.gather(*(process_sitemap(sub_url, session, depth + 1) for sub_url in sub_sitemap_urls))
+            urls.update(*results)
     
     return urls
 
 
-def is_root_domain_url(url: str) -> bool:
-    """Check if the URL is a root-level domain URL."""
-    parsed = urlparse(url)
-    # Consider it a root URL if the path is empty or just '/'
-    return parsed.path == "" or parsed.path == "/"
+def page_digest(content: str) -> bytes:
+    """Digest of a page's text with markup and whitespace removed."""
+    normalized = TAG_OR_SPACE_RE.sub('', content)
+    return hashlib.blake2b(normalized.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def parse_html(content: str):
+    """Parse an HTML page with lxml, or return None if there is no document."""
+    try:
+        try:
+            return lxml.html.document_fromstring(content)
+        except ValueError:
+            # lxml rejects str input with an XML encoding declaration
+            return lxml.html.document_fromstring(content.encode('utf-8'))
+    except etree.ParserError:
+        return None
 
 
 def extract_root_urls(urls: Set[str]) -> Set[str]:
@@ -114,24 +246,26 @@ def extract_root_urls(urls: Set[str]) -> Set[str]:
     domains = {}
     
     for url in urls:
-        parsed = urlparse(url)
-        domain = parsed.netloc
+        scheme, domain, path = _cached_urlparse(url)
+        root_url = f"{scheme or 'https'}://{domain}/"
         
-        # If it's a root URL, use it directly
-        if is_root_domain_url(url):
-            domains[domain] = url
-        # Otherwise, if we haven't seen this domain or we don't have a root URL yet
-        elif domain not in domains:
-            # Create a root URL for this domain
-            scheme = parsed.scheme or "https"
-            domains[domain] = f"{scheme}://{domain}/"
+        # A root URL (empty path or '/') always wins; otherwise keep the first one seen
+        if path in ("", "/"):
+            domains[domain] = root_url
+        else:
+            domains.setdefault(domain, root_url)
     
     return set(domains.values())
 
 
-async def extract_business_info(url: str, session: aiohttp.ClientSession) -> Dict[str, Any]:
-    """Extract business information from a URL."""
-    console.print(f"[green]Extracting business info:[/] {url}")
+async def extract_business_info(url: str, session: aiohttp.ClientSession,
+                                pool: Optional[Executor] = None) -> Dict[str, Any]:
+    """Extract business information from a URL.
+
+    The page is fetched on the event loop; parsing runs in ``pool`` when given
+    (a process pool, so pages are parsed in parallel outside the GIL).
+    """
+    logger.debug("Extracting business info: %s", url)
     
     content = await fetch_url(url, session)
     if not content:
@@ -141,52 +275,82 @@ async def extract_business_info(url: str, session: aiohttp.ClientSession) -> Dic
             "error_message": "Failed to fetch content"
         }
     
-    soup = BeautifulSoup(content, 'html.parser')
+    # Skip parsing when an identical page was already extracted from another URL
+    digest = page_digest(content)
+    if digest in seen_page_digests:
+        logger.debug("Duplicate page skipped: %s", url)
+        return {
+            "url": url,
+            "status": "duplicate",
+            "duplicate_of": seen_page_digests[digest]
+        }
+    seen_page_digests[digest] = url
+    
+    if pool is None:
+        return parse_business(url, content)
+    return await asyncio.get_running_loop().run_in_executor(pool, parse_business, url, content)
+
+
+def parse_business(url: str, content: str) -> Dict[str, Any]:
+    """Extract business fields from a fetched page (pure function, runs in worker processes)."""
+    tree = parse_html(content)
+    if tree is None:
+        return {
+            "url": url,
+            "status": "error",
+            "error_message": "Empty document"
+        }
     
     # Extract basic info
-    title = soup.title.string.strip() if soup.title else ""
+    title_tag = TITLE_XPATH(tree)
+    title = title_tag[0].text_content().strip() if title_tag else ""
     
-    # Extract meta description
+    # Extract meta description in one pass (name="description" first, then og:description)
     description = ""
-    meta_desc = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
-    if meta_desc and meta_desc.get('content'):
-        description = meta_desc['content'].strip()
+    meta_desc = None
+    for meta in META_DESCRIPTION_XPATH(tree):
+        if meta.get('name') == 'description':
+            meta_desc = meta
+            break
+        if meta_desc is None:
+            meta_desc = meta
+    if meta_desc is not None and meta_desc.get('content'):
+        description = meta_desc.get('content').strip()
+    
+    # Regex fallbacks run on the visible text only, not on the raw HTML
+    page_text = '\n'.join(PAGE_TEXT_XPATH(tree))
     
     # Extract address (common patterns)
     address = ""
     address_candidates = []
     
     # Look for address in elements with specific classes/IDs
-    for selector in ['.address', '#address', '[itemprop="address"]', '.contact-info', '.location', '.footer']:
-        elements = soup.select(selector)
-        for element in elements:
-            text = element.get_text().strip()
-            if text and len(text) > 5 and len(text) < 200:  # Reasonable address length
-                address_candidates.append(text)
+    for element in ADDRESS_XPATH(tree):
+        text = element.text_content().strip()
+        if text and len(text) > 5 and len(text) < 200:  # Reasonable address length
+            address_candidates.append(text)
+            if len(text) > GOOD_ADDRESS_LEN:
+                # A complete-looking address was found; skip the remaining elements
+                break
     
     # Look for address patterns in the text
     if not address_candidates:
         # Try to find text with address-like patterns (like street, avenue, etc.)
-        address_patterns = [
-            r'\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr|Court|Ct|Place|Pl|Terrace|Ter)[\s,]+[A-Za-z\s]+(?:,\s*[A-Z]{2})?\s*\d{5}(?:-\d{4})?',
-            r'(?:calle|av\.|avenida|carrera|autopista|paseo)\s+[A-Za-z0-9\s]+(?:,\s*[A-Za-z\s]+)?(?:,\s*[A-Za-z\s]+)?',
-        ]
-        
-        for pattern in address_patterns:
-            # Search in page content
-            for match in re.finditer(pattern, content, re.IGNORECASE):
-                address_candidates.append(match.group(0).strip())
+        # Search in page content
+        for match in ADDRESS_RE.finditer(page_text):
+            address_candidates.append(match.group(0).strip())
+            if len(address_candidates) >= MAX_ADDRESS_MATCHES:
+                break
                 
     # Pick the best address candidate
     if address_candidates:
-        # Sort by length (prefer longer addresses as they're more likely to be complete)
-        address_candidates.sort(key=len, reverse=True)
-        address = address_candidates[0]
+        # Prefer the longest (more likely to be complete); first one wins on ties
+        address = max(address_candidates, key=len)
     
     # Extract email addresses
     email = ""
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    emails = re.findall(email_pattern, content)
+    # Plain substring check first: pages without '@' skip the regex entirely
+    emails = EMAIL_RE.findall(page_text) if '@' in page_text else []
     if emails:
         email = emails[0]  # Take the first email found
     
@@ -203,26 +367,59 @@ async def extract_business_info(url: str, session: aiohttp.ClientSession) -> Dic
     return business_data
 
 
-async def process_root_url(url: str, session: aiohttp.ClientSession, sitemap_url: str) -> Dict[str, Any]:
+async def process_root_url(url: str, session: aiohttp.ClientSession, sitemap_url: str,
+                           pool: Optional[Executor] = None) -> Optional[Dict[str, Any]]:
     """Process a root URL to extract business information."""
     normalized_url = normalize_url(url)
     
-    # Skip if already processed
-    if normalized_url in businesses_data:
-        return businesses_data[normalized_url]
+    # Skip if already processed (marked before awaiting so concurrent tasks don't repeat it)
+    if normalized_url in seen_urls:
+        return None
+    seen_urls.add(normalized_url)
     
     # Extract business information
-    business_data = await extract_business_info(normalized_url, session)
+    business_data = await extract_business_info(normalized_url, session, pool)
     business_data["sitemap_url"] = sitemap_url
     
-    # Store in our dictionary
-    businesses_data[normalized_url] = business_data
-    
     return business_data
 
 
-async def main(sitemap_url: str, max_concurrent: int = 5, output_file: str = None):
-    """Main function to process sitemaps and extract business data."""
+class ResultWriter:
+    """Write results to the output file as they complete.
+
+    Paths ending in .jsonl get one JSON object per line; any other path gets
+    the usual indented JSON array, closed when the run ends.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, 'wb')
+        self.jsonl = path.endswith('.jsonl')
+        self.count = 0
+        if not self.jsonl:
+            self.file.write(b'[')
+
+    def write(self, result: Dict[str, Any]):
+        if self.jsonl:
+            self.file.write(json_dumps(result) + b'\n')
+        else:
+            item = json_dumps(result, indent=True).replace(b'\n', b'\n  ')
+            self.file.write((b'\n  ' if self.count == 0 else b',\n  ') + item)
+        self.count += 1
+        # Keep what has been written so far on disk if the run is interrupted
+        self.file.flush()
+
+    def close(self):
+        if not self.jsonl:
+            self.file.write(b'\n]' if self.count else b']')
+        self.file.close()
+
+
+async def main(sitemap_url: str, max_concurrent: int = 5, output_file: str = None) -> None:
+    """Main function to process sitemaps and extract business data.
+
+    Results are streamed to output_file as they complete rather than kept in
+    memory, so nothing is returned; read output_file for the result dicts.
+    """
     start_time = time.time()
     console.print(f"[bold blue]Starting business data extraction from[/] [bold]{sitemap_url}[/]")
     
@@ -231,83 +428,99 @@ async def main(sitemap_url: str, max_concurrent: int = 5, output_file: str = Non
     ssl_context.check_hostname = False
     ssl_context.verify_mode = ssl.CERT_NONE
     
-    # Test the URL first to make sure it's accessible
-    try:
-        test_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False))
-        test_response = await test_session.get(sitemap_url, ssl=False)
-        console.print(f"[green]Initial connection test successful, status code: {test_response.status}[/]")
-        await test_session.close()
-    except Exception as e:
-        console.print(f"[red]Error testing URL connection: {e}[/]")
-        # If you want to try a fallback approach, you can implement it here
-            
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-        # Step 1: Process the main sitemap to find all URLs
-        all_urls = await process_sitemap(sitemap_url, session)
-        console.print(f"[bold green]Found {len(all_urls)} URLs in total[/]")
+    # Size the connection pool to the concurrency and cache DNS for the whole run
+    connector = aiohttp.TCPConnector(
+        ssl=False,
+        limit=max_concurrent * 4,
+        limit_per_host=max_concurrent,
+        ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=REQUEST_TIMEOUT)
+    # Parsing and regex work is CPU-bound: run it on all cores while the loop keeps fetching
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            # Test the URL first to make sure it's accessible. A HEAD request has no
+            # body to drain, so its connection goes back to the session's pool and
+            # is reused by the sitemap fetch
+            try:
+                async with session.head(sitemap_url, ssl=False, allow_redirects=True) as test_response:
+                    console.print(f"[green]Initial connection test successful, status code: {test_response.status}[/]")
+            except Exception as e:
+                console.print(f"[red]Error testing URL connection: {e}[/]")
+                # If you want to try a fallback approach, you can implement it here
         
-        # Step 2: Extract root domains from all URLs
-        root_urls = extract_root_urls(all_urls)
-        console.print(f"[bold green]Identified {len(root_urls)} unique root domains[/]")
+            # Step 1: Process the main sitemap to find all URLs
+            all_urls = await process_sitemap(sitemap_url, session)
+            console.print(f"[bold green]Found {len(all_urls)} URLs in total[/]")
         
-        # Step 3: Process each root URL to extract business information
-        semaphore = asyncio.Semaphore(max_concurrent)
+            # Step 2: Extract root domains from all URLs
+            root_urls = extract_root_urls(all_urls)
+            console.print(f"[bold green]Identified {len(root_urls)} unique root domains[/]")
         
-        async def process_with_semaphore(url):
-            async with semaphore:
-                if exit_flag:
-                    return None
-                return await process_root_url(url, session, sitemap_url)
+            # Step 3: Process each root URL to extract business information
+            semaphore = asyncio.Semaphore(max_concurrent)
         
-        tasks = [process_with_semaphore(url) for url in root_urls]
-        results = []
+            async def process_with_semaphore(url):
+                async with semaphore:
+                    if exit_flag:
+                        return None
+                    return await process_root_url(url, session, sitemap_url, pool)
         
-        total = len(tasks)
-        completed = 0
+            tasks = [process_with_semaphore(url) for url in root_urls]
         
-        for future in asyncio.as_completed(tasks):
-            result = await future
-            if result:
-                results.append(result)
-            
-            completed += 1
-            if completed % 10 == 0 or completed == total:
-                elapsed = time.time() - start_time
-                per_item = elapsed / completed if completed > 0 else 0
-                remaining = (total - completed) * per_item
-                
-                console.print(f"[bold]Progress:[/] {completed}/{total} ({completed/total*100:.1f}%) | " 
-                              f"Elapsed: {elapsed:.1f}s | ETA: {remaining:.1f}s")
-        
-        console.print(f"[bold green]Completed processing {len(results)} businesses[/]")
+            # Step 4: Write each result as it completes instead of keeping them all in memory
+            writer = ResultWriter(output_file) if output_file else None
+            status_counts = Counter()
         
-        # Step 4: Save results
-        if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
-            console.print(f"[bold]Results saved to:[/] {output_file}")
+            total = len(tasks)
+            completed = 0
         
-        # Print summary
-        success_count = sum(1 for r in results if r.get("status") == "processed")
-        error_count = sum(1 for r in results if r.get("status") == "error")
+            try:
+                for future in asyncio.as_completed(tasks):
+                    result = await future
+                    if result:
+                        status_counts[result.get("status")] += 1
+                        if writer:
+                            writer.write(result)
+                
+                    completed += 1
+                    if completed % 10 == 0 or completed == total:
+                        elapsed = time.time() - start_time
+                        per_item = elapsed / completed if completed > 0 else 0
+                        remaining = (total - completed) * per_item
+                    
+                        console.print(f"[bold]Progress:[/] {completed}/{total} ({completed/total*100:.1f}%) | " 
+                                      f"Elapsed: {elapsed:.1f}s | ETA: {remaining:.1f}s")
+            finally:
+                if writer:
+                    writer.close()
         
-        console.print("[bold]===============================")
-        console.print(f"[bold]Total businesses processed:[/] {len(results)}")
-        console.print(f"[bold green]Successfully processed:[/] {success_count}")
-        console.print(f"[bold red]Failed to process:[/] {error_count}")
-        console.print(f"[bold]Time taken:[/] {time.time() - start_time:.2f} seconds")
-        console.print("[bold]===============================")
+            processed_total = sum(status_counts.values())
+            console.print(f"[bold green]Completed processing {processed_total} businesses[/]")
+            if output_file:
+                console.print(f"[bold]Results saved to:[/] {output_file}")
         
-        return results
+            # Print summary
+            console.print("[bold]===============================")
+            console.print(f"[bold]Total businesses processed:[/] {processed_total}")
+            console.print(f"[bold green]Successfully processed:[/] {status_counts['processed']}")
+            console.print(f"[bold red]Failed to process:[/] {status_counts['error']}")
+            console.print(f"[bold yellow]Duplicate pages skipped:[/] {status_counts['duplicate']}")
+            console.print(f"[bold]Time taken:[/] {time.time() - start_time:.2f} seconds")
+            console.print("[bold]===============================")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract business data from sitemaps")
     parser.add_argument("sitemap_url", help="URL of the sitemap to process")
     parser.add_argument("--max-concurrent", type=int, default=5, help="Maximum number of concurrent requests")
-    parser.add_argument("--output", help="Output file path (JSON format)")
+    parser.add_argument("--output", help="Output file path (JSON array, or JSON Lines if it ends in .jsonl)")
+    parser.add_argument("--verbose", action="store_true", help="Log every sitemap and URL as it is processed")
     
     args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
     
     try:
         asyncio.run(main(args.sitemap_url, args.max_concurrent, args.output))
@@ -1,18 +1,22 @@
 #!/usr/bin/env python3
+import io
 import os
 import sys
 import psutil
 import asyncio
 import hashlib
+import html
 import argparse
 import json # Added for JSON output
-from typing import List, Tuple, Dict, Any # Added Any
+from typing import List, Tuple, Dict, Any, AsyncIterator # Added Any
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 import re
-import requests
-import xml.etree.ElementTree as ElementTree
+from io import BytesIO
+from lxml import etree
 from urllib.parse import urlparse
-from collections import defaultdict
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
 from rich.console import Console
 import time  # Add time module
 import aiohttp
@@ -20,39 +24,212 @@ from bs4 import BeautifulSoup
 import ssl
 import random
 
+# orjson is optional: faster C serializer, with the json module as fallback
+try:
+    import orjson
+
+    def json_dumps(data: Any, indent: bool = False) -> bytes:
+        """Serialize to UTF-8 JSON bytes."""
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=option)
+except ImportError:
+    def json_dumps(data: Any, indent: bool = False) -> bytes:
+        """Serialize to UTF-8 JSON bytes."""
+        return json.dumps(data, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
 # Evitar problemas de SSL
 ssl._create_default_https_context = ssl._create_unverified_context
 
 # --- SSE Handling ---
+# Events are written to a block-buffered stdout and flushed periodically instead
+# of issuing one write() per event. Terminal events flush right away.
+SSE_BUFFER_SIZE = 64 * 1024
+SSE_FLUSH_INTERVAL = 0.25  # seconds
+SSE_FLUSH_EVENTS = {"END", "CANCELLED", "ERROR"}
+
+
+def install_sse_buffer(buffer_size: int = SSE_BUFFER_SIZE):
+    """Replaces sys.stdout with a block-buffered writer of the given size."""
+    sys.stdout.flush()
+    sys.stdout = io.TextIOWrapper(
+        open(sys.stdout.fileno(), "wb", buffering=buffer_size, closefd=False),
+        encoding="utf-8",
+        errors="replace",
+        line_buffering=False,
+        write_through=False,
+    )
+
+
+async def flush_sse_periodically(interval: float = SSE_FLUSH_INTERVAL):
+    """Flushes buffered SSE output every `interval` seconds until cancelled."""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            sys.stdout.flush()
+    finally:
+        sys.stdout.flush()
+
+
+async def run_with_sse_flusher(coro):
+    """Runs `coro` while a background task keeps flushing buffered SSE output."""
+    flusher = asyncio.create_task(flush_sse_periodically())
+    try:
+        return await coro
+    finally:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+
+
+# While a coalesce_sse() block is active, SSE lines are collected here and
+# written with a single call when the block exits
+_sse_pending: List[str] | None = None
+
+
+def emit_sse_line(line: str):
+    """Writes one complete SSE line, or queues it inside a coalesce_sse() block."""
+    if _sse_pending is not None:
+        _sse_pending.append(line)
+    else:
+        sys.stdout.write(line)
+
+
+@contextmanager
+def coalesce_sse():
+    """Groups the SSE lines emitted inside the block into one stdout write."""
+    global _sse_pending
+    if _sse_pending is not None: # Already coalescing
+        yield
+        return
+    _sse_pending = []
+    try:
+        yield
+    finally:
+        lines, _sse_pending = _sse_pending, None
+        if lines:
+            sys.stdout.write("".join(lines))
+
+
 # Function to safely print SSE data to stdout
 def send_sse_message(event_type: str, data: Any):
     """Formats and prints data as a Server-Sent Event message."""
     try:
-        # Convert data to JSON string if it's a dict or list
+        # Convert data to JSON string if it's a dict or list. JSON never contains
+        # raw line breaks, so only plain strings need sanitizing
         if isinstance(data, (dict, list)):
-            data_str = json.dumps(data)
+            data_str = json_dumps(data).decode('utf-8')
         else:
-            data_str = str(data)
-        # Basic sanitization: remove newlines within the data
-        data_str = data_str.replace('\\n', ' ').replace('\\r', '')
-        print(f"SSE_DATA:{event_type}:{data_str}", flush=True)
+            data_str = data if type(data) is str else str(data)
+            if '\n' in data_str or '\r' in data_str:
+                data_str = data_str.replace('\n', ' ').replace('\r', '')
+        emit_sse_line(f"SSE_DATA:{event_type}:{data_str}\n")
+        if event_type in SSE_FLUSH_EVENTS and _sse_pending is None:
+            sys.stdout.flush()
     except Exception as e:
         # Fallback for unexpected errors during SSE formatting/printing
         print(f"SSE_DATA:ERROR:Failed to send SSE message ({event_type}): {e}", flush=True)
 
 
+class SSEBatcher:
+    """
+    Groups many small events of one type into a single `<TYPE>_BATCH` message
+    carrying a JSON array. A batch is sent once it holds `max_items` entries,
+    once `max_delay` seconds have passed since its first entry, or on flush().
+    """
+
+    def __init__(self, max_items: int = 64, max_delay: float = 0.1):
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.event_type = None
+        self.items = []
+        self.started_at = 0.0
+
+    def add(self, event_type: str, payload: Any):
+        if self.items and event_type != self.event_type:
+            self.flush()
+        if not self.items:
+            self.event_type = event_type
+            self.started_at = time.monotonic()
+        self.items.append(payload)
+        if len(self.items) >= self.max_items or time.monotonic() - self.started_at >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if self.items:
+            send_sse_message(f"{self.event_type}_BATCH", self.items)
+            self.items = []
+
+
 # Initialize rich console for stderr logging only
 console = Console(stderr=True) # Send rich output to stderr
 
 # --- Progress saving ---
+PROGRESS_DIR = os.path.join(os.getcwd(), "data", "progress")
+
+
 class ProgressTracker:
+    """
+    Tracks processed URLs for a session. Each result is appended as one JSON
+    line to progress_<session_id>.jsonl, so checkpointing costs O(1) per URL
+    and a rerun with the same session id resumes from that file.
+    """
+
     def __init__(self, session_id=None):
         self.session_id = session_id or f"session_{int(time.time())}"
         self.found_urls = set()
         self.processed_urls = set()
+        self.success_urls = set()
+        self.failed_urls = set()
         self.success_count = 0
         self.fail_count = 0
         self.start_time = time.time()
+        os.makedirs(PROGRESS_DIR, exist_ok=True)
+        self.progress_path = os.path.join(PROGRESS_DIR, f"progress_{self.session_id}.jsonl")
+        self._load_progress()
+        self._progress_file = open(self.progress_path, "ab", buffering=64 * 1024)
+
+    def _load_progress(self):
+        """Rebuilds the success/failed sets by streaming the checkpoint file."""
+        if not os.path.exists(self.progress_path):
+            return
+        with open(self.progress_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # Partial last line from an interrupted run
+                url = entry.get("u")
+                if not url:
+                    continue
+                if entry.get("s"):
+                    self.success_urls.add(url)
+                    self.failed_urls.discard(url)
+                else:
+                    self.failed_urls.add(url)
+                    self.success_urls.discard(url)
+
+    def _checkpoint(self, url, ok):
+        if ok:
+            self.success_urls.add(url)
+            self.failed_urls.discard(url)
+        else:
+            self.failed_urls.add(url)
+            self.success_urls.discard(url)
+        self._progress_file.write(json_dumps({"u": url, "s": 1 if ok else 0, "t": round(time.time(), 2)}) + b"\n")
+
+    def was_processed(self, url):
+        return url in self.success_urls or url in self.failed_urls
+
+    def get_stats(self):
+        return {"success_count": len(self.success_urls), "failure_count": len(self.failed_urls)}
+
+    def save_progress(self):
+        """Flushes buffered checkpoint lines to disk."""
+        self._progress_file.flush()
+
+    def close(self):
+        """Flushes and closes the checkpoint file; safe to call more than once."""
+        if not self._progress_file.closed:
+            self._progress_file.close()
         
     def add_url(self, url):
         self.found_urls.add(url)
@@ -63,6 +240,7 @@ class ProgressTracker:
     def add_success(self, url, title, preview="", email="", address=""):
         self.processed_urls.add(url)
         self.success_count += 1
+        self._checkpoint(url, True)
         # Enviar evento al frontend
         data = {
             "url": url,
@@ -72,25 +250,26 @@ class ProgressTracker:
             "address": address,
             "time": round(time.time() - self.start_time, 2)
         }
-        self._send_sse("SUCCESS", json.dumps(data))
+        self._send_sse("SUCCESS", data)
         
     def add_fail(self, url, error):
         self.processed_urls.add(url)
         self.fail_count += 1
+        self._checkpoint(url, False)
         # Enviar evento al frontend
         data = {
             "url": url,
             "error": error,
             "time": round(time.time() - self.start_time, 2)
         }
-        self._send_sse("FAIL", json.dumps(data))
+        self._send_sse("FAIL", data)
         
     def status_message(self, msg):
         # Enviar estado al frontend
         self._send_sse("STATUS", msg)
         
     def _send_sse(self, event_type, data):
-        print(f"SSE_DATA:{event_type}:{data}", flush=True)
+        send_sse_message(event_type, data)
 
 # --- Signal Handling ---
 import signal
@@ -108,87 +287,207 @@ signal.signal(signal.SIGTERM, handle_sigterm)
 # --- End Signal Handling ---
 
 
+# Shared HTTP session for sitemap fetches: keeps connections alive between requests.
+# Created on first use inside the running event loop, closed by close_http_session().
+_http_session: aiohttp.ClientSession | None = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Returns the shared aiohttp session, creating it if needed."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=128, limit_per_host=64, ssl=False, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+    return _http_session
+
+
+async def close_http_session():
+    """Closes the shared aiohttp session, if it was opened."""
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+
 async def fetch_url_content(url: str) -> bytes | None:
     """Asynchronously fetches content from a URL."""
     try:
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, requests.get, url, {"timeout": 10})
-        response.raise_for_status()
-        return response.content
-    except requests.RequestException as e:
+        async with get_http_session().get(url) as response:
+            response.raise_for_status()
+            return await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         console.print(f"[yellow]Warning:[/] Failed to fetch {url}: {e}")
         return None
 
 
+# Only <loc> elements in the sitemap namespace are URLs (not <image:loc>, <video:loc>...)
+SITEMAP_LOC_TAG = "{http://www.sitemaps.org/schemas/sitemap/0.9}loc"
+SITEMAP_ROOT_RE = re.compile(rb"<(urlset|sitemapindex)[\s>]")
+SITEMAP_LOC_RE = re.compile(rb"<loc>\s*([^<]*?)\s*</loc>")
+
+
+def scan_sitemap_locs(content: bytes) -> Tuple[str, List[str]] | None:
+    """
+    Fast path for plain, well-formed sitemaps: finds the root tag and the <loc>
+    entries with regexes instead of an XML parser. Returns None whenever the
+    document has a shape the scan does not handle (prefixed tags, CDATA,
+    non UTF-8 text...), so the caller can fall back to the parser.
+    """
+    root = SITEMAP_ROOT_RE.search(content, 0, 4096)
+    if not root or b"<![CDATA[" in content:
+        return None
+    try:
+        locs = [m.group(1).decode("utf-8") for m in SITEMAP_LOC_RE.finditer(content)]
+    except UnicodeDecodeError:
+        return None
+    if len(locs) != content.count(b"</loc>"):
+        return None
+    locs = [html.unescape(loc) if "&" in loc else loc for loc in locs if loc]
+    return root.group(1).decode("ascii"), locs
+
+
+def parse_sitemap_locs(content: bytes) -> Tuple[str | None, List[str]]:
+    """
+    Returns the root tag (without namespace) of a sitemap and the text of its
+    sitemap-namespace <loc> entries. Plain sitemaps go through scan_sitemap_locs; anything else is
+    streamed with lxml iterparse, releasing entries as they are read so large
+    sitemaps are never held in memory as a full tree.
+    """
+    scanned = scan_sitemap_locs(content)
+    if scanned is not None:
+        return scanned
+
+    root_tag = None
+    locs = []
+    for event, elem in etree.iterparse(BytesIO(content), events=("start", "end"),
+                                       tag=("{*}urlset", "{*}sitemapindex", SITEMAP_LOC_TAG)):
+        localname = etree.QName(elem).localname
+        if event == "start":
+            if root_tag is None:
+                root_tag = localname
+            continue
+        if localname != "loc":
+            continue
+        if elem.text and elem.text.strip():
+            locs.append(elem.text.strip())
+        # Drop the finished entry and everything before it
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while parent.getprevious() is not None:
+                del parent.getparent()[0]
+    return root_tag, locs
+
+
+SITEMAP_FETCH_CONCURRENCY = 16
+
+
 async def get_all_urls_from_sitemap(initial_sitemap_url: str) -> List[str]:
+    """Collects every URL yielded by iter_sitemap_urls into a list."""
+    return [url async for url in iter_sitemap_urls(initial_sitemap_url)]
+
+
+async def iter_sitemap_urls(initial_sitemap_url: str) -> AsyncIterator[str]:
     """
-    Recursively fetches and parses sitemaps (XML) to extract all non-sitemap URLs,
-    sending FOUND_URL events via SSE.
+    Recursively fetches and parses sitemaps (XML) and yields each unique
+    non-sitemap URL, sending FOUND_URL events via SSE. The sitemap tree is walked
+    level by level, fetching every sitemap of a level concurrently. URLs are
+    yielded as soon as their sitemap is parsed, so a consumer can start working
+    before discovery finishes.
     """
     all_final_urls = set()
-    sitemaps_to_process = [initial_sitemap_url]
+    sitemaps_to_process = deque([initial_sitemap_url])
+    sitemaps_queued = {initial_sitemap_url} # Mirrors the queue for O(1) membership checks
     processed_sitemaps = set()
-    namespace = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
     url_count = 0
+    batcher = SSEBatcher()
+    fetch_semaphore = asyncio.Semaphore(SITEMAP_FETCH_CONCURRENCY)
+
+    async def fetch_sitemap(url):
+        async with fetch_semaphore:
+            return await fetch_url_content(url)
 
     send_sse_message("STATUS", f"Starting sitemap processing: {initial_sitemap_url}")
 
     while sitemaps_to_process:
         if stop_event.is_set():
              send_sse_message("CANCELLED", "Sitemap processing stopped by signal.")
-             return list(all_final_urls) # Return what was found so far
-
-        current_sitemap_url = sitemaps_to_process.pop(0)
-        if current_sitemap_url in processed_sitemaps:
-            continue
-
-        send_sse_message("STATUS", f"Processing sitemap: {current_sitemap_url}")
-        processed_sitemaps.add(current_sitemap_url)
-
-        content = await fetch_url_content(current_sitemap_url)
-        if not content:
-            send_sse_message("WARN", f"Failed to fetch content for sitemap: {current_sitemap_url}")
-            continue # Skip if fetch failed
+             return # Everything found so far was already yielded
+
+        # Everything queued so far forms the current level of the tree
+        level = []
+        while sitemaps_to_process:
+            sitemap_url = sitemaps_to_process.popleft()
+            sitemaps_queued.discard(sitemap_url)
+            if sitemap_url not in processed_sitemaps:
+                processed_sitemaps.add(sitemap_url)
+                level.append(sitemap_url)
+                send_sse_message("STATUS", f"Processing sitemap: {sitemap_url}")
+
+        contents = await asyncio.gather(*(fetch_sitemap(u) for u in level), return_exceptions=True)
+
+        for current_sitemap_url, content in zip(level, contents):
+            if isinstance(content, BaseException) or not content:
+                send_sse_message("WARN", f"Failed to fetch content for sitemap: {current_sitemap_url}")
+                continue # Skip if fetch failed
+
+            new_urls = []
+            try:
+                tag_suffix, locs = parse_sitemap_locs(content)
+
+                if tag_suffix == "sitemapindex":
+                    sitemap_locs = locs
+                    send_sse_message("STATUS", f"Found {len(sitemap_locs)} nested sitemaps in {current_sitemap_url}")
+                    for loc in sitemap_locs:
+                        if loc not in processed_sitemaps and loc not in sitemaps_queued:
+                            sitemaps_to_process.append(loc)
+                            sitemaps_queued.add(loc)
+                elif tag_suffix == "urlset":
+                    url_locs = locs
+                    for loc in url_locs:
+                        if loc.lower().endswith(".xml"): # It's another sitemap
+                            if loc not in processed_sitemaps and loc not in sitemaps_queued:
+                                 send_sse_message("STATUS", f"Found nested sitemap: {loc}")
+                                 sitemaps_to_process.append(loc)
+                                 sitemaps_queued.add(loc)
+                        else: # It's a final URL
+                            final_url = loc # Renombrar para claridad
+                            if final_url not in all_final_urls:
+                                 all_final_urls.add(final_url)
+                                 new_urls.append(final_url)
+                                 url_count += 1
+                                 # Imprimir para SSE (agrupadas en FOUND_URL_BATCH)
+                                 batcher.add("FOUND_URL", final_url)
+                    batcher.flush()
+                    if new_urls:
+                         send_sse_message("STATUS", f"Added {len(new_urls)} URLs from {current_sitemap_url}. Total found: {url_count}")
 
-        try:
-            root = ElementTree.fromstring(content)
-            tag_suffix = root.tag.split('}')[-1] # Handle namespace prefixes
-
-            if tag_suffix == "sitemapindex":
-                sitemap_locs = [loc.text for loc in root.findall(".//ns:loc", namespace)]
-                send_sse_message("STATUS", f"Found {len(sitemap_locs)} nested sitemaps in {current_sitemap_url}")
-                for loc in sitemap_locs:
-                    if loc not in processed_sitemaps and loc not in sitemaps_to_process:
-                        sitemaps_to_process.append(loc)
-            elif tag_suffix == "urlset":
-                url_locs = [loc.text for loc in root.findall(".//ns:loc", namespace)]
-                initial_count = len(all_final_urls)
-                for loc in url_locs:
-                    if loc.lower().endswith(".xml"): # It's another sitemap
-                        if loc not in processed_sitemaps and loc not in sitemaps_to_process:
-                             send_sse_message("STATUS", f"Found nested sitemap: {loc}")
-                             sitemaps_to_process.append(loc)
-                    else: # It's a final URL
-                        final_url = loc # Renombrar para claridad
-                        if final_url not in all_final_urls:
-                             all_final_urls.add(final_url)
-                             url_count += 1
-                             # Imprimir para SSE
-                             send_sse_message("FOUND_URL", final_url)
-                added_count = len(all_final_urls) - initial_count
-                if added_count > 0:
-                     send_sse_message("STATUS", f"Added {added_count} URLs from {current_sitemap_url}. Total found: {url_count}")
+                else:
+                     send_sse_message("WARN", f"Unknown root tag '{tag_suffix}' in {current_sitemap_url}")
 
+            except etree.XMLSyntaxError as e:
+                send_sse_message("ERROR", f"Failed to parse XML from {current_sitemap_url}: {e}")
+            except Exception as e:
+                send_sse_message("ERROR", f"Unexpected error processing {current_sitemap_url}: {e}")
             else:
-                 send_sse_message("WARN", f"Unknown root tag '{root.tag}' in {current_sitemap_url}")
-
-        except ElementTree.ParseError as e:
-            send_sse_message("ERROR", f"Failed to parse XML from {current_sitemap_url}: {e}")
-        except Exception as e:
-            send_sse_message("ERROR", f"Unexpected error processing {current_sitemap_url}: {e}")
+                # Hand the URLs of this sitemap to the consumer
+                for url in new_urls:
+                    yield url
 
     send_sse_message("STATUS", f"Sitemap processing finished. Found {len(all_final_urls)} unique URLs.")
-    return list(all_final_urls)
+
+
+def _quick_valid(url: str) -> bool:
+    """Cheap check for the usual http(s)://host... shape, without urlparse."""
+    if url.startswith("https://"):
+        start = 8
+    elif url.startswith("http://"):
+        start = 7
+    else:
+        return False
+    return len(url) > start and url[start] not in "/?#"
 
 
 def get_sitemap_url(site_url):
@@ -200,16 +499,20 @@ def get_sitemap_url(site_url):
 
 
 # FileOrganizer is kept for local saving logic if enabled, but structure preview is removed
+NON_WORD_RE = re.compile(r"[^\w\-]")
+
+
 class FileOrganizer:
     def __init__(self):
         self.used_names: Dict[str, Dict[str, str]] = defaultdict(dict)
 
-    def clean_filename(self, name: str) -> str:
-        name = re.sub(r"[^\w\-]", " ", name)
-        name = re.sub(r"\s+", " ", name)
-        name = name.strip().title()
-        name = name.replace(" ", "_")
-        return name
+    @staticmethod
+    @lru_cache(maxsize=8192)
+    def clean_filename(name: str) -> str:
+        # Path segments repeat a lot across a sitemap, hence the cache
+        name = NON_WORD_RE.sub(" ", name)
+        # split() collapses and strips the runs of spaces left by the substitution
+        return "_".join(name.split()).title()
 
     def organize_path(self, url: str) -> Tuple[str, str]:
         parsed = urlparse(url)
@@ -235,7 +538,7 @@ class FileOrganizer:
         if filename in self.used_names[directory_path]:
              if url != self.used_names[directory_path][filename]:
                  # Add a simple hash to differentiate
-                 url_hash = hashlib.md5(url.encode()).hexdigest()[:6]
+                 url_hash = hashlib.blake2b(url.encode(), digest_size=3).hexdigest()
                  filename = f"{filename_base}_{url_hash}.md"
 
         self.used_names[directory_path][filename] = url
@@ -244,6 +547,65 @@ class FileOrganizer:
 # Removed preview_file_structure as it relies on Rich Tree
 
 
+class FileWriter:
+    """
+    Writes scraped files from one background task so disk I/O never blocks the
+    event loop. Pending writes are drained together and handed to a worker
+    thread in a single call. Per-URL metadata goes to one shared JSONL file,
+    appended with a single os.write per drain.
+    """
+
+    def __init__(self, on_error, metadata_path: str):
+        self.on_error = on_error # Called as on_error(url, exception)
+        self.metadata_fd = os.open(metadata_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    def write(self, url: str, files: List[Tuple[str, bytes]], metadata: bytes = b""):
+        self.queue.put_nowait((url, files, metadata))
+
+    async def close(self):
+        self.queue.put_nowait(None)
+        await self.task
+        os.close(self.metadata_fd)
+
+    async def _run(self):
+        done = False
+        while not done:
+            pending = [await self.queue.get()]
+            while not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+            if None in pending:
+                done = True
+                pending = [item for item in pending if item is not None]
+            if pending:
+                for url, error in await asyncio.to_thread(self._write_all, pending):
+                    self.on_error(url, error)
+
+    def _write_all(self, pending) -> List[Tuple[str, Exception]]:
+        errors = []
+        metadata = []
+        for url, files, meta in pending:
+            try:
+                for path, data in files:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "wb") as f:
+                        f.write(data)
+            except OSError as e:
+                errors.append((url, e))
+            else:
+                if meta:
+                    metadata.append(meta)
+        if metadata:
+            data = memoryview(b"".join(metadata))
+            try:
+                while data:
+                    data = data[os.write(self.metadata_fd, data):]
+            except OSError as e:
+                errors.extend((url, e) for url, _, meta in pending if meta)
+        return errors
+
+
 class MemoryMonitor:
     def __init__(self, verbosity: int = 0):
         self.verbose = verbosity >= 3
@@ -270,19 +632,74 @@ class MemoryMonitor:
              self.process = None # Stop trying
 
 
+    async def sample(self, interval: float = 1.0):
+        """Logs memory usage every `interval` seconds until cancelled."""
+        while self.verbose and self.process:
+            self.log(prefix="●")
+            await asyncio.sleep(interval)
+
     def get_peak_memory_mb(self) -> int | None:
         if not self.process: return None
         return self.peak_memory // (1024 * 1024)
 
 
+class DomainLimiter:
+    """
+    Per-host throttling for the crawler: at most `per_host` concurrent requests
+    to the same netloc, a randomized delay before each one, and an exponential
+    backoff (capped at `max_backoff` seconds) while the host answers 429/503.
+    """
+    THROTTLE_CODES = (429, 503)
+    # An exception only counts as throttling when it carries an HTTP status
+    # phrase; bare "429"/"503" digits may come from a URL, port or timestamp
+    THROTTLE_ERROR_RE = re.compile(
+        r"\b429\W{1,3}Too Many Requests\b"
+        r"|\b503\W{1,3}Service (?:Temporarily )?Unavailable\b"
+        r"|\bstatus(?:[ _]?code)?\W{1,3}(?:429|503)\b",
+        re.IGNORECASE,
+    )
+
+    def __init__(self, per_host: int = 2, min_delay: float = 0.5, max_delay: float = 1.5, max_backoff: float = 60.0):
+        self.per_host = per_host
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_backoff = max_backoff
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.backoff: Dict[str, float] = defaultdict(float)
+
+    def for_host(self, host: str) -> asyncio.Semaphore:
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self.semaphores[host]
+
+    def delay(self, host: str) -> float:
+        return random.uniform(self.min_delay, self.max_delay) + self.backoff[host]
+
+    def is_throttled(self, status_code: Any = None, error: Exception = None) -> bool:
+        if status_code in self.THROTTLE_CODES:
+            return True
+        return error is not None and self.THROTTLE_ERROR_RE.search(str(error)) is not None
+
+    def record(self, host: str, throttled: bool):
+        if throttled:
+            self.backoff[host] = min(max(self.backoff[host] * 2, 1.0), self.max_backoff)
+        else:
+            self.backoff[host] = 0.0
+
+
 async def crawl_parallel(
     output_dir: str,
-    urls: List[str],
+    urls: List[str] | AsyncIterator[str],
     max_concurrent: int = 3,
     verbosity: int = 0,
     save_files: bool = False,
     session_id: str = None
 ) -> Dict[str, Any]:
+    """
+    Crawls `urls` with a pool of `max_concurrent` workers fed through a bounded
+    queue. `urls` may be a list or an async iterator (e.g. iter_sitemap_urls),
+    in which case crawling starts while URLs are still being discovered.
+    """
 
     if save_files:
         console.print(f"[bold blue]Parallel Scraping Outputting to:[/] {output_dir}")
@@ -297,44 +714,80 @@ async def crawl_parallel(
     memory_monitor = MemoryMonitor(verbosity=verbosity)
     results_data = {"success": [], "failed": [], "errors": [], "summary": {}} # Init summary
     processed_count = 0
-    task_count = len(urls)
-    
-    # Restore progress for URLs that were already processed
-    already_processed = [url for url in urls if progress.was_processed(url)]
-    unprocessed_urls = [url for url in urls if not progress.was_processed(url)]
+    queued_count = 0
+    skipped_count = 0 # Already processed according to the checkpoint
     
-    if already_processed:
-        send_sse_message("STATUS", f"Restoring progress: {len(already_processed)} URLs already processed")
+    # Restore progress from the checkpoint of this session
+    restored_count = len(progress.success_urls) + len(progress.failed_urls)
+    if restored_count:
+        send_sse_message("STATUS", f"Restoring progress: {restored_count} URLs already processed")
         stats = progress.get_stats()
         send_sse_message("RESTORE_PROGRESS", {
-            "already_processed": len(already_processed),
+            "already_processed": restored_count,
             "success": stats["success_count"],
             "failed": stats["failure_count"]
         })
         
-        # Report previously successful URLs to frontend
-        for url in progress.success_urls:
-            send_sse_message("SUCCESS", {"url": url, "title": "Restored from checkpoint", "status": "restored"})
-        
-        # Report previously failed URLs to frontend
-        for url in progress.failed_urls:
-            send_sse_message("FAIL", {"url": url, "error": "Failed in previous run", "status": "restored"})
-    
-    # If everything was already processed, we're done
-    if not unprocessed_urls:
-        send_sse_message("STATUS", "All URLs were already processed in a previous run")
-        send_sse_message("SUMMARY", {
-            "total_urls_input": len(urls),
-            "successful_scrapes": progress.get_stats()["success_count"],
-            "failed_scrapes": progress.get_stats()["failure_count"],
-            "restored_from_checkpoint": True
-        })
-        send_sse_message("END", "All URLs were previously processed")
+        with coalesce_sse():
+            # Report previously successful URLs to frontend
+            for url in progress.success_urls:
+                send_sse_message("SUCCESS", {"url": url, "title": "Restored from checkpoint", "status": "restored"})
+            
+            # Report previously failed URLs to frontend
+            for url in progress.failed_urls:
+                send_sse_message("FAIL", {"url": url, "error": "Failed in previous run", "status": "restored"})
+
+    # Producer: feeds unprocessed URLs into a bounded queue, then one sentinel per worker
+    url_queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrent * 4)
+
+    async def iterate_urls():
+        if isinstance(urls, list):
+            for url in urls:
+                yield url
+        else:
+            async for url in urls:
+                yield url
+
+    async def produce():
+        nonlocal queued_count, skipped_count
+        try:
+            async for url in iterate_urls():
+                if stop_event.is_set():
+                    break
+                if progress.was_processed(url):
+                    skipped_count += 1
+                    continue
+                await url_queue.put(url)
+                queued_count += 1
+        except Exception as e:
+            send_sse_message("ERROR", {"url": "url_producer", "error": f"Error while collecting URLs: {e}"})
+            results_data["errors"].append({"url": "url_producer", "error": str(e)})
+        finally:
+            for _ in range(max_concurrent):
+                await url_queue.put(None)
+
+    producer = asyncio.create_task(produce())
+
+    # Wait for the first URL before starting the browser
+    first_url = await url_queue.get()
+    if first_url is None:
+        await producer
+        if skipped_count:
+            send_sse_message("STATUS", "All URLs were already processed in a previous run")
+            send_sse_message("SUMMARY", {
+                "total_urls_input": skipped_count,
+                "successful_scrapes": progress.get_stats()["success_count"],
+                "failed_scrapes": progress.get_stats()["failure_count"],
+                "restored_from_checkpoint": True
+            })
+            send_sse_message("END", "All URLs were previously processed")
+        else:
+            send_sse_message("ERROR", "No valid URLs found to process.")
+            send_sse_message("END", "Scraping process aborted.")
+        progress.close()
         return results_data
-        
-    urls = unprocessed_urls
-    task_count = len(urls)
-    send_sse_message("STATUS", f"Starting parallel crawl of {task_count} unprocessed URLs...")
+
+    send_sse_message("STATUS", "Starting parallel crawl of unprocessed URLs...")
 
     browser_config = BrowserConfig(
         headless=True,
@@ -344,143 +797,167 @@ async def crawl_parallel(
     crawl_config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS)
 
     crawler = None # Initialize crawler variable
+    file_writer = None
+    # Memory is sampled on its own cadence instead of around every batch
+    memory_sampler = asyncio.create_task(memory_monitor.sample())
     try:
+        if save_files:
+            def on_write_error(url, write_e):
+                error_message = f"Error writing file for {url}: {write_e}"
+                send_sse_message("ERROR", {"url": url, "error": error_message}) # Send write error
+                if url not in results_data["failed"]:
+                    results_data["failed"].append(url)
+                results_data["errors"].append({"url": url, "error": error_message})
+                progress.add_fail(url, error_message)
+
+            file_writer = FileWriter(on_write_error, os.path.join(output_dir, "metadata.jsonl"))
+
         crawler = AsyncWebCrawler(config=browser_config)
         await crawler.start()
         send_sse_message("STATUS", "Browser crawler started.")
 
-        # Process URLs in smaller batches to save progress more frequently
-        batch_size = min(max_concurrent * 2, 10)  # Process 10 URLs at a time max
-        
-        for i in range(0, task_count, batch_size):
-            # --- Check for cancellation signal ---
-            if stop_event.is_set():
-                send_sse_message("CANCELLED", "Crawling stopped by signal.")
-                # Save progress before exit
-                progress.save_progress()
-                break # Exit the main processing loop
-            # --- End Check ---
-
-            batch = urls[i : i + batch_size]
-            tasks = []
-
-            for j, url in enumerate(batch):
-                session_id = f"parallel_session_{i + j}"
-                crawl_task = crawler.arun(
-                    url=url, config=crawl_config, session_id=session_id
-                )
-                tasks.append((url, crawl_task))
-
-            try:
-                memory_monitor.log(prefix="→")
-                send_sse_message("STATUS", f"Processing batch {i//batch_size + 1}/{(task_count+batch_size-1)//batch_size}: {len(batch)} URLs...")
-                batch_results = await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
-                memory_monitor.log(prefix="←")
-
-                for (url, _), result in zip(tasks, batch_results):
-                    processed_count += 1
-                    # Send detailed status update
-                    current_time = time.strftime("%H:%M:%S")
-                    send_sse_message("STATUS", f"Processed {processed_count}/{task_count}: {url} at {current_time}")
-
-                    if isinstance(result, Exception):
-                        error_message = f"Error scraping {url}: {str(result)}"
-                        # Send failure details via SSE with more info
-                        send_sse_message("FAIL", {
-                            "url": url, 
-                            "error": str(result),
-                            "time": current_time,
-                            "status": "error"
-                        })
-                        results_data["failed"].append(url)
-                        results_data["errors"].append({"url": url, "error": str(result)})
-                        progress.add_fail(url, str(result))
-                    elif result.success:
-                        # Extract content info for better reporting
-                        content_preview = result.markdown[:100] + "..." if result.markdown and len(result.markdown) > 100 else "No content"
-                        page_title = result.metadata.get('title', 'No title')
-                        
-                        # Send success details via SSE with more info
-                        send_sse_message("SUCCESS", {
-                            "url": url, 
-                            "title": page_title,
-                            "preview": content_preview,
-                            "time": current_time,
-                            "status": "success"
-                        })
-                        result_info = {
-                            "url": url,
-                            "title": page_title,
-                            "markdown_preview": content_preview
-                        }
-                        results_data["success"].append(result_info)
-                        progress.add_success(url, page_title, content_preview)
-
-                        if save_files:
-                            subdir, filename = file_organizer.organize_path(url)
-                            full_dir = os.path.join(output_dir, subdir)
-                            os.makedirs(full_dir, exist_ok=True)
-                            file_path = os.path.join(full_dir, filename)
-                            if verbosity >= 1: console.print(f"[green]✓[/] Writing: [bold]{file_path}[/]")
-                            try:
-                                with open(file_path, "w", encoding="utf-8") as f:
-                                    f.write(result.markdown)
-                                    
-                                # También guardar metadata en un archivo JSON para facilitar el acceso
-                                meta_path = os.path.join(full_dir, f"{os.path.splitext(filename)[0]}_meta.json")
-                                with open(meta_path, "w", encoding="utf-8") as f:
-                                    json.dump({
-                                        "url": url,
-                                        "title": page_title,
-                                        "scrape_time": current_time,
-                                        "metadata": result.metadata,
-                                        "session_id": session_id
-                                    }, f, indent=2)
-                                    
-                            except Exception as write_e:
-                                error_message = f"Error writing file for {url}: {write_e}"
-                                send_sse_message("ERROR", {"url": url, "error": error_message}) # Send write error
-                                if url not in results_data["failed"]:
-                                    results_data["failed"].append(url)
-                                results_data["errors"].append({"url": url, "error": error_message})
-                                progress.add_fail(url, error_message)
-
-                    else:
-                        error_message = f"Failed to scrape {url} - No content"
-                        send_sse_message("FAIL", {
-                            "url": url, 
-                            "error": "Scraping failed, no content returned",
-                            "time": current_time,
-                            "status": "no_content"
-                        })
-                        results_data["failed"].append(url)
-                        results_data["errors"].append({"url": url, "error": error_message})
-                        progress.add_fail(url, error_message)
+        # Checkpoint and report progress every few URLs
+        report_every = min(max_concurrent * 2, 10)
+        reported_count = 0 # processed_count as of the last PROGRESS_UPDATE
+        # DomainLimiter throttles each host within the max_concurrent workers
+        domain_limiter = DomainLimiter()
+
+        async def limited_arun(url, crawl_session_id):
+            host = urlparse(url).netloc
+            async with domain_limiter.for_host(host):
+                await asyncio.sleep(domain_limiter.delay(host))
+                try:
+                    result = await crawler.arun(url=url, config=crawl_config, session_id=crawl_session_id)
+                except Exception as e:
+                    domain_limiter.record(host, domain_limiter.is_throttled(error=e))
+                    raise
+                domain_limiter.record(host, domain_limiter.is_throttled(getattr(result, "status_code", None)))
+                return result
+
+        def handle_result(url, result):
+            nonlocal processed_count
+            processed_count += 1
+            # Send detailed status update
+            current_time = time.strftime("%H:%M:%S")
+            send_sse_message("STATUS", f"Processed {processed_count}/{queued_count}: {url} at {current_time}")
+
+            if isinstance(result, Exception):
+                error_message = f"Error scraping {url}: {str(result)}"
+                # Send failure details via SSE with more info
+                send_sse_message("FAIL", {
+                    "url": url, 
+                    "error": str(result),
+                    "time": current_time,
+                    "status": "error"
+                })
+                results_data["failed"].append(url)
+                results_data["errors"].append({"url": url, "error": str(result)})
+                progress.add_fail(url, str(result))
+            elif result.success:
+                # Extract content info for better reporting
+                content_preview = result.markdown[:100] + "..." if result.markdown and len(result.markdown) > 100 else "No content"
+                page_title = result.metadata.get('title', 'No title')
+            
+                # Send success details via SSE with more info
+                send_sse_message("SUCCESS", {
+                    "url": url, 
+                    "title": page_title,
+                    "preview": content_preview,
+                    "time": current_time,
+                    "status": "success"
+                })
+                result_info = {
+                    "url": url,
+                    "title": page_title,
+                    "markdown_preview": content_preview
+                }
+                results_data["success"].append(result_info)
+                progress.add_success(url, page_title, content_preview)
+
+                if save_files:
+                    subdir, filename = file_organizer.organize_path(url)
+                    full_dir = os.path.join(output_dir, subdir)
+                    file_path = os.path.join(full_dir, filename)
+                    if verbosity >= 1: console.print(f"[green]✓[/] Writing: [bold]{file_path}[/]")
+                    # La metadata va a metadata.jsonl (una línea por URL) en lugar de un _meta.json por archivo
+                    file_writer.write(url, [(file_path, result.markdown.encode("utf-8"))], json_dumps({
+                        "url": url,
+                        "file": os.path.join(subdir, filename),
+                        "title": page_title,
+                        "scrape_time": current_time,
+                        "metadata": result.metadata,
+                        "session_id": session_id
+                    }) + b"\n")
 
-                # Save progress after each batch
-                progress.save_progress()
-
-            except Exception as batch_e:
-                # Handle errors during asyncio.gather or within the batch loop itself
-                error_message = f"Error processing batch starting with {batch[0]}: {str(batch_e)}"
-                send_sse_message("ERROR", {"url": "batch_error", "error": error_message})
-                # Mark URLs in this batch as failed if possible, otherwise just log the batch error
-                for url, _ in tasks:
-                    if url not in results_data["failed"]:
-                        results_data["failed"].append(url)
-                        progress.add_fail(url, f"Batch error: {str(batch_e)}")
-                results_data["errors"].append({"url": "batch_error", "error": error_message})
-
-            # Send periodic progress updates
+            else:
+                error_message = f"Failed to scrape {url} - No content"
+                send_sse_message("FAIL", {
+                    "url": url, 
+                    "error": "Scraping failed, no content returned",
+                    "time": current_time,
+                    "status": "no_content"
+                })
+                results_data["failed"].append(url)
+                results_data["errors"].append({"url": url, "error": error_message})
+                progress.add_fail(url, error_message)
+
+            if processed_count % report_every == 0:
+                report_progress()
+
+        def report_progress():
+            # Save progress and send a periodic update; the total grows while URLs are discovered
+            nonlocal reported_count
+            reported_count = processed_count
+            progress.save_progress()
             stats = progress.get_stats()
             send_sse_message("PROGRESS_UPDATE", {
                 "processed": processed_count,
-                "total": task_count,
+                "total": queued_count,
                 "success": stats["success_count"],
                 "failed": stats["failure_count"],
-                "percent_complete": round((processed_count / task_count) * 100, 1)
+                "percent_complete": round((processed_count / max(queued_count, 1)) * 100, 1)
             })
 
+        async def worker(crawl_session_id, url):
+            # url is the first URL to crawl (or None); afterwards pull from the queue.
+            # Each worker keeps one crawler session so its browser tab is reused
+            while True:
+                if url is None:
+                    url = await url_queue.get()
+                    if url is None:
+                        return
+                if stop_event.is_set():
+                    url = None # Keep draining so the producer never blocks
+                    continue
+                try:
+                    result = await limited_arun(url, crawl_session_id)
+                except Exception as e:
+                    result = e
+                try:
+                    # One write for all the events of this URL
+                    with coalesce_sse():
+                        handle_result(url, result)
+                except Exception as handle_e:
+                    error_message = f"Error handling result for {url}: {str(handle_e)}"
+                    send_sse_message("ERROR", {"url": url, "error": error_message})
+                    if url not in results_data["failed"]:
+                        results_data["failed"].append(url)
+                        progress.add_fail(url, error_message)
+                    results_data["errors"].append({"url": url, "error": error_message})
+                url = None
+
+        workers = [
+            asyncio.create_task(worker(f"parallel_session_{k}", first_url if k == 0 else None))
+            for k in range(max_concurrent)
+        ]
+        await asyncio.gather(producer, *workers)
+
+        if stop_event.is_set():
+            send_sse_message("CANCELLED", "Crawling stopped by signal.")
+        # Final update, unless the last periodic one already covered every URL
+        if processed_count != reported_count:
+            report_progress()
+
     except Exception as e:
         # Catch critical errors like crawler failing to start
         error_msg = f"Critical error during scraping: {str(e)}"
@@ -488,8 +965,16 @@ async def crawl_parallel(
         results_data["errors"].append({"url": "critical_error", "error": str(e)})
 
     finally:
-        # Final save before cleanup
-        progress.save_progress()
+        producer.cancel()
+        memory_sampler.cancel()
+        memory_monitor.log(prefix="←") # Last sample so the reported peak covers the whole run
+
+        # Wait for queued file writes; their errors still update progress
+        if file_writer:
+            await file_writer.close()
+
+        # Final save before cleanup: flush and close the checkpoint file
+        progress.close()
         
         if crawler:
             send_sse_message("STATUS", "Closing browser crawler...")
@@ -503,10 +988,10 @@ async def crawl_parallel(
     
     # Calculate and send final summary
     results_data["summary"] = {
-        "total_urls_input": len(urls) + len(already_processed),
+        "total_urls_input": queued_count + skipped_count,
         "successful_scrapes": stats["success_count"],
         "failed_scrapes": stats["failure_count"],
-        "restored_from_checkpoint": len(already_processed) > 0,
+        "restored_from_checkpoint": skipped_count > 0,
         "peak_memory_mb": memory_monitor.get_peak_memory_mb() if verbosity >=3 else None
     }
     send_sse_message("SUMMARY", results_data["summary"])
@@ -556,10 +1041,33 @@ async def main(
         except Exception:
             domain_for_folder = "local_output"
 
-    # Get all URLs, sending FOUND_URL events during the process
-    all_urls = await get_all_urls_from_sitemap(initial_sitemap_url)
+    async def discover_urls():
+        """Yields valid URLs from the sitemap(s), or the site root if none are found."""
+        found = 0
+        try:
+            # FOUND_URL events are sent while the sitemaps are processed
+            async for url in iter_sitemap_urls(initial_sitemap_url):
+                if _quick_valid(url):
+                    found += 1
+                    yield url
+                    continue
+                # Full parse only for URLs outside the common shape
+                try:
+                    parsed = urlparse(url)
+                    if parsed.scheme and parsed.netloc:
+                        found += 1
+                        yield url
+                    else:
+                        send_sse_message("WARN", f"Skipping invalid URL from sitemap: {url}")
+                except Exception as e:
+                    send_sse_message("WARN", f"Could not parse URL '{url}' from sitemap: {e}")
+        finally:
+            await close_http_session()
+
+        if found:
+            send_sse_message("STATUS", f"Prepared {found} unique valid URLs for scraping.")
+            return
 
-    if not all_urls:
         send_sse_message("WARN", "No URLs found in sitemap(s), attempting to scrape the top-level URL only.")
         parsed_root = urlparse(site_url)
         scheme = parsed_root.scheme if parsed_root.scheme else 'https'
@@ -572,37 +1080,12 @@ async def main(
         try:
             parsed_check = urlparse(root_url)
             if parsed_check.scheme and parsed_check.netloc:
-                urls_to_process = [root_url]
                 send_sse_message("FOUND_URL", root_url) # Send the single URL
+                yield root_url
             else:
                  send_sse_message("ERROR", f"Could not derive a valid root URL from input: {site_url}")
-                 urls_to_process = []
         except Exception as e:
              send_sse_message("ERROR", f"Error parsing derived root URL '{root_url}': {e}")
-             urls_to_process = []
-
-    else:
-        # URLs already sent via FOUND_URL during sitemap processing
-        # Filter out potentially invalid URLs before processing (basic check)
-        valid_urls = []
-        for url in all_urls:
-            try:
-                parsed = urlparse(url)
-                if parsed.scheme and parsed.netloc:
-                    valid_urls.append(url)
-                else:
-                    send_sse_message("WARN", f"Skipping invalid URL from sitemap: {url}")
-            except Exception as e:
-                send_sse_message("WARN", f"Could not parse URL '{url}' from sitemap: {e}")
-        urls_to_process = sorted(list(set(valid_urls))) # Ensure uniqueness and sort
-        send_sse_message("STATUS", f"Prepared {len(urls_to_process)} unique valid URLs for scraping.")
-
-
-    if not urls_to_process:
-         send_sse_message("ERROR", "No valid URLs found to process.")
-         send_sse_message("END", "Scraping process aborted.")
-         # Optionally: exit here if no URLs? sys.exit(1)
-         return # Return early
 
     # Output directory logic remains for potential file saving
     output_folder = os.path.join(os.getcwd(), domain_for_folder)
@@ -610,7 +1093,7 @@ async def main(
     # Dry run might just list found URLs and exit?
     if dry_run:
         send_sse_message("STATUS", "[Dry Run] Would process the following URLs:")
-        for url in urls_to_process:
+        async for url in discover_urls():
              send_sse_message("DRY_RUN_URL", url)
         send_sse_message("STATUS", "[Dry Run] Completed. No scraping performed.")
         send_sse_message("END", "[Dry Run] Finished.")
@@ -620,11 +1103,12 @@ async def main(
     # Set save_files based on output_format or another flag if needed
     save_files_locally = output_format in ['files', 'both'] # Example: Add a 'files' output format
 
-    # Perform the crawl - progress is sent via SSE messages from within the function
+    # Perform the crawl - progress is sent via SSE messages from within the function.
+    # URLs are crawled while the sitemaps are still being discovered.
     # The final returned 'results' might be less important if frontend consumes SSE
     results = await crawl_parallel(
         output_folder,
-        urls_to_process,
+        discover_urls(),
         max_concurrent=max_concurrent,
         verbosity=verbosity,
         save_files=save_files_locally,
@@ -642,8 +1126,10 @@ if __name__ == "__main__":
     parser.add_argument("--sse", action="store_true", help="Enable SSE output mode")
     parser.add_argument("--output_dir", "-o", default="./data", help="Output directory for saved data")
     parser.add_argument("--output_format", choices=["json", "md", "sse"], default="sse", help="Output format")
+    parser.add_argument("--sse-buffer-size", type=int, default=SSE_BUFFER_SIZE, help="Size in bytes of the stdout buffer used for SSE events")
 
     args = parser.parse_args()
+    install_sse_buffer(args.sse_buffer_size)
 
     # Asegurar que tenemos una URL del sitemap
     if not args.sitemap:
@@ -665,12 +1151,12 @@ if __name__ == "__main__":
     send_sse_message("STATUS", f"Using sitemap URL: {sitemap_url}")
     
     try:
-        asyncio.run(main(
+        asyncio.run(run_with_sse_flusher(main(
             site_url=sitemap_url,
             max_concurrent=args.max_concurrent,
             verbosity=args.verbose,
             output_format="sse"  # Forzar formato SSE
-        ))
+        )))
         # Enviar evento de finalización
         send_sse_message("STATUS", "Extraction completed successfully")
     except Exception as e:
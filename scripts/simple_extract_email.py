@@ -1,92 +1,187 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import html
 import json
+import os
 import re
 import sys
 import requests
+import aiohttp
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 import ssl
 import time
 
-# Evitar problemas de SSL
-ssl._create_default_https_context = ssl._create_unverified_context
+# orjson es opcional: codificador JSON en C más rápido, con json como alternativa
+try:
+    import orjson
+    
+    def json_dumps(data):
+        # El proceso padre decodifica stdout por fragmentos: mantener la salida
+        # en ASCII y usar json (con escapes \uXXXX) si hay caracteres no ASCII
+        encoded = orjson.dumps(data)
+        return encoded.decode('ascii') if encoded.isascii() else json.dumps(data)
+except ImportError:
+    json_dumps = json.dumps
+
+# Contexto SSL sin verificación creado una sola vez y compartido por todas las
+# conexiones (en lugar de parchear ssl globalmente)
+SSL_CTX = ssl.create_default_context()
+SSL_CTX.check_hostname = False
+SSL_CTX.verify_mode = ssl.CERT_NONE
+
+# Patrones compilados una sola vez al cargar el módulo
+# (el dominio debe tener al menos un punto: la regex ya lo exige, sin filtro posterior)
+EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}')
+MAILTO_RE = re.compile(rb'href\s*=\s*["\']mailto:([^"\'?>\s]+)', re.I)
+# Bloques <script>/<style>: código y CSS solo aportan falsos positivos
+SCRIPT_RE = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.I | re.S)
+
+# Cabeceras compartidas por la sesión de requests y por el modo por lotes (aiohttp)
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+# Sesión HTTP reutilizable con las cabeceras fijadas una sola vez
+session = requests.Session()
+session.headers.update(HEADERS)
+session.verify = False
+
+def parse_page(url, content, html_text):
+    """Extrae título y correos electrónicos del HTML ya descargado (bytes y texto decodificado)."""
+    # Analizar el contenido HTML (parser lxml, en C)
+    soup = BeautifulSoup(content, 'lxml')
+    
+    # Extraer título (como str: un NavigableString arrastra el árbol al enviarse entre procesos)
+    title = soup.title.string if soup.title else "Sin título"
+    if title is not None:
+        title = str(title)
+    
+    # Los emails ofuscados con entidades (info&#64;sitio.com) se decodifican antes de buscar
+    if '&#' in html_text:
+        html_text = html.unescape(html_text)
+    
+    # Encontrar emails directamente en el HTML descargado, sin volver a serializar el árbol
+    # ni analizar <script>/<style>. Sin '@' en la página se evita el escaneo con regex
+    emails = EMAIL_RE.findall(SCRIPT_RE.sub(' ', html_text)) if '@' in html_text else []
+    
+    # También buscar enlaces mailto: con una regex sobre los bytes, sin recorrer los <a> del árbol
+    mailto_emails = [m.group(1).decode('ascii', 'ignore').strip() for m in MAILTO_RE.finditer(content)]
+    
+    # Los mailto: se validan con la misma regex que el resto
+    emails += [email for email in mailto_emails if EMAIL_RE.fullmatch(email)]
+    
+    # Normalizar y eliminar duplicados en un único conjunto; el email principal es el primero encontrado
+    unique_emails = set()
+    primary_email = None
+    for email in emails:
+        email = email.lower()
+        if email not in unique_emails:
+            unique_emails.add(email)
+            if primary_email is None:
+                primary_email = email
+    
+    # Construir resultado
+    result = {
+        'url': url,
+        'title': title,
+        'email': primary_email,
+        'all_emails': sorted(unique_emails),
+        'timestamp': time.time()
+    }
+    
+    return result
+
+def error_result(url, e):
+    """Resultado básico que se devuelve cuando una URL no se puede procesar."""
+    return {
+        'url': url,
+        'error': str(e),
+        'title': 'Error al procesar',
+        'email': None,
+        'timestamp': time.time()
+    }
 
 def extract_email_from_url(url):
     """Extrae correo electrónico de una URL específica."""
     try:
         # Intentar obtener el contenido de la página
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10, verify=False)
+        response = session.get(url, timeout=10)
         response.raise_for_status()
-        
-        # Analizar el contenido HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extraer título
-        title = soup.title.string if soup.title else "Sin título"
-        
-        # Encontrar emails en el HTML
-        html_text = str(soup)
-        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        emails = re.findall(email_pattern, html_text)
-        
-        # Filtrar emails válidos (con . en el dominio)
-        valid_emails = [email for email in emails if '.' in email.split('@')[1]]
-        
-        # Eliminar duplicados
-        unique_emails = list(set(valid_emails))
-        
-        # También buscar enlaces mailto:
-        mailto_links = [a.get('href') for a in soup.find_all('a', href=True) if 'mailto:' in a.get('href', '')]
-        for link in mailto_links:
-            email = link.replace('mailto:', '').split('?')[0].strip()
-            if email and '@' in email and '.' in email.split('@')[1]:
-                unique_emails.append(email)
-        
-        # Tomar el primer email encontrado (si hay alguno)
-        primary_email = unique_emails[0] if unique_emails else None
-        
-        # Construir resultado
-        result = {
-            'url': url,
-            'title': title,
-            'email': primary_email,
-            'all_emails': unique_emails,
-            'timestamp': time.time()
-        }
-        
-        return result
+        return parse_page(url, response.content, response.text)
         
     except Exception as e:
         # En caso de error, devolver información básica
-        return {
-            'url': url,
-            'error': str(e),
-            'title': 'Error al procesar',
-            'email': None,
-            'timestamp': time.time()
-        }
+        return error_result(url, e)
+
+async def extract_email_async(url, http, pool, semaphore):
+    """
+    Versión asíncrona de extract_email_from_url sobre una sesión aiohttp compartida.
+    La descarga se hace en el bucle de eventos (como mucho tantas a la vez como
+    permita semaphore) y el análisis (CPU) en el pool de procesos.
+    """
+    try:
+        async with semaphore:
+            async with http.get(url) as response:
+                response.raise_for_status()
+                content = await response.read()
+                html_text = await response.text(errors='replace')
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, parse_page, url, content, html_text)
+    except asyncio.TimeoutError:
+        return error_result(url, "Tiempo de espera agotado")
+    except Exception as e:
+        return error_result(url, e)
+
+async def extract_emails_from_file(path, max_concurrent=50):
+    """
+    Procesa todas las URLs de un fichero (una por línea) en un único proceso y
+    escribe un resultado JSON por línea (JSONL) a medida que termina cada una.
+    Solo hay max_concurrent descargas en curso; los tiempos límite son por
+    socket, así que las URLs que esperan turno no agotan su tiempo.
+    """
+    with open(path, encoding='utf-8') as f:
+        urls = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    
+    semaphore = asyncio.Semaphore(max_concurrent)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_concurrent, ssl=SSL_CTX),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10),
+            headers=HEADERS
+        ) as http:
+            for task in asyncio.as_completed([extract_email_async(url, http, pool, semaphore) for url in urls]):
+                print(json_dumps(await task), flush=True)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Extraer email desde una URL')
-    parser.add_argument('--url', required=True, help='URL de la página web a analizar')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--url', help='URL de la página web a analizar')
+    source.add_argument('--urls-file', help='Fichero con una URL por línea; escribe un resultado JSON por línea')
+    parser.add_argument('--max_concurrent', type=int, default=50, help='Conexiones simultáneas en modo --urls-file')
     
     args = parser.parse_args()
     
+    if args.urls_file:
+        try:
+            asyncio.run(extract_emails_from_file(args.urls_file, args.max_concurrent))
+        except Exception as e:
+            print(f"Error crítico procesando {args.urls_file}: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    
     try:
         result = extract_email_from_url(args.url)
         # Imprimir resultado como JSON para que pueda ser procesado por el llamador
-        print(json.dumps(result))
+        print(json_dumps(result))
     except Exception as e:
         # Asegurar que siempre devolvemos un JSON válido incluso en caso de error crítico
-        print(json.dumps({
+        print(json_dumps({
             'url': args.url,
             'error': f"Error crítico: {str(e)}",
             'email': None,
@@ -1,101 +1,287 @@
 #!/usr/bin/env python3
 import os
+import io
 import sys
+import atexit
 import asyncio
 import argparse
 import json
-import requests
-import xml.etree.ElementTree as ElementTree
+import sqlite3
+import aiohttp
+from collections import deque
+from contextlib import aclosing
+from lxml import etree
 from urllib.parse import urlparse
 import time
 from bs4 import BeautifulSoup
 import ssl
 import re
+import html
 
-# Evitar problemas de SSL
-ssl._create_default_https_context = ssl._create_unverified_context
+# orjson es opcional: codificador JSON en C más rápido, con json como alternativa.
+# Devuelve bytes para escribirlos directamente en el buffer SSE
+try:
+    import orjson
+    
+    def json_dumps(data):
+        # El proceso padre decodifica stdout por fragmentos: mantener la salida
+        # en ASCII y usar json (con escapes \uXXXX) si hay caracteres no ASCII
+        encoded = orjson.dumps(data)
+        return encoded if encoded.isascii() else json.dumps(data).encode('ascii')
+except ImportError:
+    def json_dumps(data):
+        return json.dumps(data).encode('ascii')
+
+# Contexto SSL sin verificación creado una sola vez y compartido por todas las
+# conexiones (en lugar de parchear ssl globalmente)
+SSL_CTX = ssl.create_default_context()
+SSL_CTX.check_hostname = False
+SSL_CTX.verify_mode = ssl.CERT_NONE
+
+# Patrones compilados una sola vez al cargar el módulo; trabajan sobre los bytes
+# descargados para no tener que decodificar ni analizar la página completa
+# (el dominio debe tener al menos un punto: la regex ya lo exige, sin filtro posterior)
+EMAIL_RE = re.compile(rb'[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}')
+TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title>', re.I | re.S)
+# Etiquetas de apertura/cierre de <script> y <style>: su contenido no se analiza
+BLOCK_TAG_RE = re.compile(rb'<(/?)(?:script|style)\b[^>]*>', re.I)
+
+# Lectura de páginas por trozos: tamaño de trozo, solapamiento entre trozos
+# (un email no supera ~64 caracteres) y bytes iniciales donde se busca el título
+CHUNK_SIZE = 16384
+EMAIL_OVERLAP = 64
+TITLE_SCAN_BYTES = 8192
+
+# Cada cuántas URLs terminadas se envía un evento PROGRESS
+PROGRESS_EVERY = 10
+
+# Caché de resultados por dominio: {netloc: {"email", "title", "ts"}}. Se carga
+# desde SQLite al empezar y se guarda al terminar, para que las ejecuciones
+# siguientes no vuelvan a descargar dominios con email ya conocido
+DATA_DIR = os.path.join(os.getcwd(), 'data')
+CACHE_DB_PATH = os.path.join(DATA_DIR, 'email_cache.sqlite')
+CACHE_MAX_AGE = 7 * 24 * 3600
+DOMAIN_CACHE = {}
+# Espacio de nombres de los sitemaps: solo sus <loc> son URLs (no <image:loc>, <video:loc>...)
+SITEMAP_LOC_TAG = '{http://www.sitemaps.org/schemas/sitemap/0.9}loc'
+
+# Los sitemaps descargados se guardan en la misma base de datos (tabla http_cache)
+# junto con su ETag/Last-Modified para repetir la descarga con GET condicional.
+# Los que superan HTTP_CACHE_MAX_BODY no se guardan para no retenerlos en memoria
+SITEMAP_CHUNK_SIZE = 32768
+HTTP_CACHE_MAX_BODY = 8 * 1024 * 1024
+# Conexión a la base de datos de caché, abierta una sola vez por ejecución
+_cache_conn = None
+
+# Cabeceras compartidas por todas las peticiones de la sesión
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+}
 
 # --- SSE Handling ---
+# Los mensajes SSE se acumulan en un buffer de 64KB sobre stdout en lugar de
+# hacer una escritura por evento. Se vacía con los eventos finales, cada
+# SSE_FLUSH_INTERVAL segundos mientras corre main() y al salir del proceso.
+SSE_FLUSH_EVENTS = {"SUMMARY", "ERROR"}
+SSE_FLUSH_INTERVAL = 0.1
+_sse_out = io.BufferedWriter(io.FileIO(sys.stdout.fileno(), 'wb', closefd=False), 65536)
+atexit.register(_sse_out.flush)
+
 def send_sse_message(event_type, data):
     """Formatea y envía datos como un mensaje de tipo Server-Sent Event."""
     try:
         if isinstance(data, (dict, list)):
-            data_str = json.dumps(data)
+            # El JSON compacto nunca contiene saltos de línea
+            _sse_out.write(b"SSE_DATA:%s:%s\n" % (event_type.encode(), json_dumps(data)))
         else:
-            data_str = str(data)
-        data_str = data_str.replace('\n', ' ').replace('\r', '')
-        print(f"SSE_DATA:{event_type}:{data_str}", flush=True)
+            data_str = str(data).replace('\n', ' ').replace('\r', '')
+            _sse_out.write(f"SSE_DATA:{event_type}:{data_str}\n".encode('utf-8', 'replace'))
     except Exception as e:
-        print(f"SSE_DATA:ERROR:Error al enviar mensaje SSE ({event_type}): {e}", flush=True)
+        _sse_out.write(f"SSE_DATA:ERROR:Error al enviar mensaje SSE ({event_type}): {e}\n".encode('utf-8', 'replace'))
+    if event_type in SSE_FLUSH_EVENTS:
+        _sse_out.flush()
+
+async def flush_sse_periodically():
+    """Vacía el buffer SSE cada SSE_FLUSH_INTERVAL segundos hasta ser cancelada."""
+    try:
+        while True:
+            await asyncio.sleep(SSE_FLUSH_INTERVAL)
+            _sse_out.flush()
+    finally:
+        _sse_out.flush()
 
-async def fetch_url_content(url):
-    """Obtiene de forma asíncrona el contenido de una URL."""
+async def run_with_sse_flusher(coro):
+    """Ejecuta coro mientras una tarea en segundo plano vacía el buffer SSE."""
+    flusher = asyncio.create_task(flush_sse_periodically())
     try:
-        # Usar requests de forma bloqueante pero ejecutado en un thread separado
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, lambda: requests.get(url, timeout=10, verify=False))
+        return await coro
+    finally:
+        flusher.cancel()
+
+def create_session(max_concurrent):
+    """
+    Crea la sesión aiohttp compartida (keep-alive y pool de conexiones).
+    El propio pool limita la concurrencia: max_concurrent conexiones en total
+    y como mucho 2 por host, para no saturar ningún servidor.
+    Los tiempos límite son por socket (conexión y lectura) y no cuentan la
+    espera hasta obtener una conexión libre del pool.
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=max_concurrent,
+            limit_per_host=2,
+            ttl_dns_cache=300,
+            use_dns_cache=True,
+            ssl=SSL_CTX
+        ),
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10),
+        headers=HEADERS
+    )
+
+def root_of(url):
+    """
+    Devuelve la URL raíz (esquema://host/) de una URL absoluta. Equivale a
+    f"{p.scheme}://{p.netloc}/" con p = urlparse(url), pero sin crear un
+    ParseResult por cada URL del sitemap.
+    """
+    start = url.find('://') + 3
+    end = len(url)
+    for sep in '/?#':
+        i = url.find(sep, start, end)
+        if i != -1:
+            end = i
+    return url[:end] + '/'
+
+async def fetch_sitemap_chunks(url, session):
+    """
+    Descarga un sitemap por trozos con GET condicional. Si hay una copia en
+    http_cache se envían If-None-Match/If-Modified-Since y, ante un 304, se
+    devuelve el cuerpo guardado. Las respuestas 200 con ETag o Last-Modified
+    de hasta HTTP_CACHE_MAX_BODY bytes se guardan para la siguiente ejecución.
+    """
+    cached = load_cached_response(url)
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    async with session.get(url, headers=headers) as response:
+        if response.status == 304 and cached:
+            send_sse_message("STATUS", f"Sitemap sin cambios, usando copia local: {url}")
+            body = cached[2]
+            for start in range(0, len(body), SITEMAP_CHUNK_SIZE):
+                yield body[start:start + SITEMAP_CHUNK_SIZE]
+            return
+
         response.raise_for_status()
-        return response.content
-    except requests.RequestException as e:
-        print(f"Advertencia: Error al obtener {url}: {e}", file=sys.stderr)
-        return None
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        parts = [] if (etag or last_modified) else None
+        size = 0
+        async for chunk in response.content.iter_chunked(SITEMAP_CHUNK_SIZE):
+            if parts is not None:
+                size += len(chunk)
+                if size > HTTP_CACHE_MAX_BODY:
+                    parts = None  # Demasiado grande para la caché: se deja de acumular
+                else:
+                    parts.append(chunk)
+            yield chunk
+
+    if parts:
+        store_cached_response(url, etag, last_modified, b''.join(parts))
+
+async def iter_sitemap(url, session):
+    """
+    Descarga un sitemap por trozos y lo analiza a medida que llega con un
+    XMLPullParser. Primero devuelve (etiqueta_raíz, None) y después
+    (etiqueta_raíz, loc) por cada <loc> del espacio de nombres de sitemaps
+    (se ignoran <image:loc> y similares), liberando cada entrada ya leída.
+    No devuelve nada si la respuesta está vacía.
+    """
+    parser = etree.XMLPullParser(events=("start", "end"), tag=("{*}urlset", "{*}sitemapindex", SITEMAP_LOC_TAG))
+    root_tag = None
+    received = False
+    async with aclosing(fetch_sitemap_chunks(url, session)) as chunks:
+        async for chunk in chunks:
+            received = True
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                name = etree.QName(elem).localname
+                if event == "start":
+                    if root_tag is None:
+                        root_tag = name
+                        yield root_tag, None
+                    continue
+                if name != "loc":
+                    continue
+                if elem.text and elem.text.strip():
+                    yield root_tag, elem.text.strip()
+                # Liberar la entrada ya procesada y las anteriores
+                elem.clear(keep_tail=True)
+                parent = elem.getparent()
+                if parent is not None:
+                    while parent.getprevious() is not None:
+                        del parent.getparent()[0]
+    if received:
+        root = parser.close()  # Lanza XMLSyntaxError si el documento está incompleto
+        if root_tag is None:  # Raíz que no es de sitemap (no pasa el filtro de etiquetas)
+            yield etree.QName(root).localname, None
 
-async def get_all_urls_from_sitemap(sitemap_url):
+async def get_all_urls_from_sitemap(sitemap_url, session):
     """
     Extrae recursivamente todas las URLs de un sitemap XML y envía eventos SSE para cada URL encontrada.
     Filtra para obtener solo las URLs raíz de cada dominio.
     """
     all_urls = set()
     root_domains = set()  # Para almacenar las URLs raíz de cada dominio
-    sitemaps_to_process = [sitemap_url]
-    processed_sitemaps = set()
-    namespace = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+    root_urls = []  # Las mismas URLs raíz, en el orden en que aparecen
+    sitemaps_to_process = deque([sitemap_url])
+    queued_sitemaps = {sitemap_url}  # Sitemaps ya encolados (procesados o pendientes)
     url_count = 0
     root_count = 0
 
     send_sse_message("STATUS", f"Iniciando procesamiento del sitemap: {sitemap_url}")
 
     while sitemaps_to_process:
-        current_sitemap_url = sitemaps_to_process.pop(0)
-        if current_sitemap_url in processed_sitemaps:
-            continue
-
+        current_sitemap_url = sitemaps_to_process.popleft()
         send_sse_message("STATUS", f"Procesando sitemap: {current_sitemap_url}")
-        processed_sitemaps.add(current_sitemap_url)
-
-        content = await fetch_url_content(current_sitemap_url)
-        if not content:
-            send_sse_message("WARN", f"No se pudo obtener contenido del sitemap: {current_sitemap_url}")
-            continue
 
+        root_tag = None
+        nested_count = 0
+        initial_count = len(all_urls)
         try:
-            root = ElementTree.fromstring(content)
-            tag_suffix = root.tag.split('}')[-1]  # Manejar prefijos de namespace
-
-            if tag_suffix == "sitemapindex":
-                sitemap_locs = [loc.text for loc in root.findall(".//ns:loc", namespace)]
-                send_sse_message("STATUS", f"Se encontraron {len(sitemap_locs)} sitemaps anidados en {current_sitemap_url}")
-                for loc in sitemap_locs:
-                    if loc not in processed_sitemaps and loc not in sitemaps_to_process:
-                        sitemaps_to_process.append(loc)
-            elif tag_suffix == "urlset":
-                url_locs = [loc.text for loc in root.findall(".//ns:loc", namespace)]
-                initial_count = len(all_urls)
-                
-                for loc in url_locs:
-                    if loc.lower().endswith(".xml"):  # Es otro sitemap
-                        if loc not in processed_sitemaps and loc not in sitemaps_to_process:
+            # Las URLs se procesan a medida que se analiza el sitemap
+            async with aclosing(iter_sitemap(current_sitemap_url, session)) as locs:
+                async for tag_suffix, loc in locs:
+                    if loc is None:
+                        root_tag = tag_suffix
+                        if root_tag not in ("sitemapindex", "urlset"):
+                            break
+                        continue
+
+                    if tag_suffix == "sitemapindex":
+                        nested_count += 1
+                        if loc not in queued_sitemaps:
+                            queued_sitemaps.add(loc)
+                            sitemaps_to_process.append(loc)
+                    elif loc.lower().endswith(".xml"):  # Es otro sitemap
+                        if loc not in queued_sitemaps:
+                            queued_sitemaps.add(loc)
                             send_sse_message("STATUS", f"Sitemap anidado encontrado: {loc}")
                             sitemaps_to_process.append(loc)
                     else:  # Es una URL final
                         # Extraer solo la URL raíz (dominio sin path)
                         try:
-                            parsed_url = urlparse(loc)
-                            root_url = f"{parsed_url.scheme}://{parsed_url.netloc}/"
+                            root_url = root_of(loc)
                             
                             # Si es la primera vez que vemos este dominio
                             if root_url not in root_domains:
                                 root_domains.add(root_url)
+                                root_urls.append(root_url)
                                 root_count += 1
                                 
                                 # Registrar solo la URL raíz en la base de datos
@@ -108,44 +294,200 @@ async def get_all_urls_from_sitemap(sitemap_url):
                                 url_count += 1
                         except Exception as e:
                             send_sse_message("ERROR", f"Error procesando URL {loc}: {str(e)}")
-                
+
+            if root_tag is None:
+                send_sse_message("WARN", f"No se pudo obtener contenido del sitemap: {current_sitemap_url}")
+            elif root_tag == "sitemapindex":
+                send_sse_message("STATUS", f"Se encontraron {nested_count} sitemaps anidados en {current_sitemap_url}")
+            elif root_tag == "urlset":
                 added_count = len(all_urls) - initial_count
                 if added_count > 0:
                     send_sse_message("STATUS", f"Se procesaron {added_count} URLs, encontrando {root_count} dominios únicos. Total URLs: {url_count}")
             else:
-                send_sse_message("WARN", f"Etiqueta raíz desconocida '{root.tag}' en {current_sitemap_url}")
+                send_sse_message("WARN", f"Etiqueta raíz desconocida '{root_tag}' en {current_sitemap_url}")
 
-        except ElementTree.ParseError as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Advertencia: Error al obtener {current_sitemap_url}: {str(e) or 'tiempo de espera agotado'}", file=sys.stderr)
+            send_sse_message("WARN", f"No se pudo obtener contenido del sitemap: {current_sitemap_url}")
+        except etree.XMLSyntaxError as e:
             send_sse_message("ERROR", f"Error al analizar XML de {current_sitemap_url}: {e}")
         except Exception as e:
             send_sse_message("ERROR", f"Error inesperado procesando {current_sitemap_url}: {e}")
 
     send_sse_message("STATUS", f"Procesamiento de sitemap finalizado. Se encontraron {len(root_domains)} dominios únicos de un total de {len(all_urls)} URLs.")
-    return list(root_domains)  # Retornar solo las URLs raíz
+    return root_urls  # Retornar solo las URLs raíz
+
+def connect_cache_db():
+    """
+    Devuelve la conexión a la base de datos de caché. Solo la primera llamada
+    abre el fichero y crea las tablas; las siguientes reutilizan la conexión.
+    """
+    global _cache_conn
+    if _cache_conn is None:
+        os.makedirs(os.path.dirname(CACHE_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(CACHE_DB_PATH)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS domain_cache ("
+            "netloc TEXT PRIMARY KEY, email TEXT, title TEXT, ts REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB, ts REAL)"
+        )
+        _cache_conn = conn
+    return _cache_conn
+
+def close_cache_db():
+    """Cierra la conexión a la base de datos de caché si está abierta."""
+    global _cache_conn
+    if _cache_conn is not None:
+        _cache_conn.close()
+        _cache_conn = None
+
+atexit.register(close_cache_db)
 
-async def extract_email_from_page(url):
-    """Extrae correos electrónicos de una página web."""
+def load_cached_response(url):
+    """Devuelve (etag, last_modified, body) de la copia guardada de url, o None."""
     try:
-        content = await fetch_url_content(url)
-        if not content:
-            return None, "No se pudo obtener contenido de la página"
-        
-        soup = BeautifulSoup(content, 'html.parser')
-        
-        # Extraer título
-        title = soup.title.string if soup.title else "Sin título"
-        
-        # Buscar correos electrónicos en el HTML usando regex
-        html_text = str(soup)
-        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        emails = re.findall(email_pattern, html_text)
-        
-        # Eliminar duplicados y filtrar resultados no válidos
-        unique_emails = list(set(emails))
-        valid_emails = [email for email in unique_emails if '.' in email.split('@')[1]]
+        return connect_cache_db().execute(
+            "SELECT etag, last_modified, body FROM http_cache WHERE url = ?", (url,)
+        ).fetchone()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Advertencia: No se pudo leer la caché HTTP: {e}", file=sys.stderr)
+        return None
+
+def store_cached_response(url, etag, last_modified, body):
+    """Guarda el cuerpo de url junto con sus validadores HTTP."""
+    try:
+        with connect_cache_db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO http_cache (url, etag, last_modified, body, ts) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body, time.time())
+            )
+    except (OSError, sqlite3.Error) as e:
+        print(f"Advertencia: No se pudo guardar la caché HTTP: {e}", file=sys.stderr)
+
+def load_domain_cache():
+    """Carga en DOMAIN_CACHE los resultados recientes guardados en ejecuciones anteriores."""
+    try:
+        rows = connect_cache_db().execute(
+            "SELECT netloc, email, title, ts FROM domain_cache WHERE ts >= ?",
+            (time.time() - CACHE_MAX_AGE,)
+        )
+        for netloc, email, title, ts in rows:
+            DOMAIN_CACHE[netloc] = {"email": email, "title": title, "ts": ts}
+    except (OSError, sqlite3.Error) as e:
+        print(f"Advertencia: No se pudo cargar la caché de dominios: {e}", file=sys.stderr)
+
+def save_domain_cache():
+    """Guarda DOMAIN_CACHE en SQLite."""
+    try:
+        with connect_cache_db() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO domain_cache (netloc, email, title, ts) VALUES (?, ?, ?, ?)",
+                [(netloc, entry["email"], entry["title"], entry["ts"]) for netloc, entry in DOMAIN_CACHE.items()]
+            )
+    except (OSError, sqlite3.Error) as e:
+        print(f"Advertencia: No se pudo guardar la caché de dominios: {e}", file=sys.stderr)
+
+def find_first_email(buffer, pos, endpos):
+    """Devuelve el primer email de buffer[pos:endpos] como (email, fin_del_match) o None."""
+    if buffer.find(b'&#', pos, endpos) != -1:
+        # Emails ofuscados con entidades (info&#64;sitio.com): se decodifica el tramo.
+        # fin_del_match solo se usa para saber si el match toca el final del tramo,
+        # así que se cuenta desde endpos con lo que queda tras él
+        span = html.unescape(buffer[pos:endpos].decode('latin-1')).encode('utf-8')
+        match = EMAIL_RE.search(span)
+        if match:
+            return match.group(0).decode('ascii'), endpos - (len(span) - match.end())
+        return None
+    if buffer.find(b'@', pos, endpos) == -1:
+        return None
+    # Los enlaces mailto: forman parte del HTML analizado: EMAIL_RE también los encuentra
+    match = EMAIL_RE.search(buffer, pos, endpos)
+    if match:
+        return match.group(0).decode('ascii'), match.end()
+    return None
+
+def find_first_visible_email(buffer, in_block):
+    """
+    Busca el primer email de buffer fuera de los bloques <script>/<style>
+    (código y CSS solo aportan falsos positivos). in_block indica si buffer
+    empieza dentro de uno de esos bloques. Devuelve el resultado de
+    find_first_email y la lista de etiquetas (inicio, dentro_de_bloque_después).
+    """
+    tags = [(m.start(), m.end(), not m.group(1)) for m in BLOCK_TAG_RE.finditer(buffer)]
+    found = None
+    pos = 0
+    for start, end, inside in tags + [(len(buffer), len(buffer), in_block)]:
+        if not in_block and start > pos:
+            found = find_first_email(buffer, pos, start)
+            if found:
+                break
+        pos = end
+        in_block = inside
+    return found, [(start, inside) for start, _, inside in tags]
+
+async def extract_email_from_page(url, session):
+    """
+    Extrae el título y el primer correo electrónico de una página web.
+    El cuerpo se descarga por trozos y la descarga se corta en cuanto aparece
+    un email; el título se busca solo en los primeros TITLE_SCAN_BYTES.
+    Si el dominio ya tiene un email en DOMAIN_CACHE no se hace ninguna petición.
+    """
+    netloc = urlparse(url).netloc
+    cached = DOMAIN_CACHE.get(netloc)
+    if cached:
+        return {"url": url, "title": cached["title"], "email": cached["email"]}, None
+
+    try:
+        head = b''
+        tail = b''
+        email = None
+        in_block = False
+        async with session.get(url) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                if len(head) < TITLE_SCAN_BYTES:
+                    head += chunk[:TITLE_SCAN_BYTES - len(head)]
+                buffer = tail + chunk
+                found, tags = find_first_visible_email(buffer, in_block)
+                # Un match que toca el final del trozo puede estar cortado: se espera al siguiente
+                if found and found[1] < len(buffer):
+                    email = found[0]
+                    break
+                # El solapamiento se vuelve a analizar en el siguiente trozo: el estado
+                # que pasa es el de las etiquetas que empiezan antes del corte
+                cut = max(0, len(buffer) - EMAIL_OVERLAP)
+                for start, inside in tags:
+                    if start < cut:
+                        in_block = inside
+                tail = buffer[cut:]
+            else:
+                found, _ = find_first_visible_email(tail, in_block)
+                if found:
+                    email = found[0]
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Advertencia: Error al obtener {url}: {str(e) or 'tiempo de espera agotado'}", file=sys.stderr)
+        return None, "No se pudo obtener contenido de la página"
+    except Exception as e:
+        return None, f"Error procesando {url}: {str(e)}"
+
+    if not head:
+        return None, "No se pudo obtener contenido de la página"
+
+    try:
+        # Extraer título con regex; BeautifulSoup solo si no hay un <title> reconocible
+        match = TITLE_RE.search(head)
+        if match:
+            title = html.unescape(match.group(1).decode('utf-8', 'replace')).strip() or "Sin título"
+        else:
+            soup = BeautifulSoup(head, 'lxml')
+            title = soup.title.string if soup.title else "Sin título"
         
-        # Retornar el primer email válido encontrado (o None si no hay)
-        email = valid_emails[0] if valid_emails else None
+        # Solo se guardan los aciertos: los dominios sin email se reintentan
+        if email:
+            DOMAIN_CACHE[netloc] = {"email": email, "title": title, "ts": time.time()}
         
         return {
             "url": url,
@@ -155,51 +497,70 @@ async def extract_email_from_page(url):
     except Exception as e:
         return None, f"Error procesando {url}: {str(e)}"
 
-async def process_urls(urls, max_concurrent=3):
-    """Procesa las URLs en paralelo con un límite de concurrencia."""
-    semaphore = asyncio.Semaphore(max_concurrent)
+async def process_urls(urls, session, total_timeout=None):
+    """
+    Procesa las URLs en paralelo; la concurrencia la limita el pool de la sesión.
+    Los resultados se recogen a medida que terminan. Si se agota total_timeout
+    (segundos), las URLs pendientes se cancelan y se marcan como error.
+    """
+    async def process_url(url):
+        send_sse_message("STATUS", f"Procesando URL: {url}")
+        result, error = await extract_email_from_page(url, session)
+        
+        if error:
+            send_sse_message("FAIL", {"url": url, "error": error})
+            return {"url": url, "status": "error", "error": error}
+        else:
+            send_sse_message("SUCCESS", {
+                "url": url,
+                "title": result.get("title", "Sin título"),
+                "email": result.get("email", "No encontrado")
+            })
+            return {
+                "url": url,
+                "status": "completed",
+                "title": result.get("title", "Sin título"),
+                "email": result.get("email", "")
+            }
     
-    async def process_url_with_semaphore(url):
-        async with semaphore:
-            send_sse_message("STATUS", f"Procesando URL: {url}")
-            result, error = await extract_email_from_page(url)
-            
-            if error:
+    tasks = {asyncio.create_task(process_url(url)): url for url in urls}
+    results = []
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=total_timeout):
+            results.append(await next_done)
+            if len(results) % PROGRESS_EVERY == 0:
+                send_sse_message("PROGRESS", {"processed": len(results), "total": len(urls)})
+    except asyncio.TimeoutError:
+        send_sse_message("WARN", f"Tiempo total agotado tras {total_timeout}s; se cancelan las URLs pendientes")
+        for task, url in tasks.items():
+            if not task.done():
+                task.cancel()
+                error = "Tiempo total de extracción agotado"
                 send_sse_message("FAIL", {"url": url, "error": error})
-                return {"url": url, "status": "error", "error": error}
-            else:
-                send_sse_message("SUCCESS", {
-                    "url": url,
-                    "title": result.get("title", "Sin título"),
-                    "email": result.get("email", "No encontrado")
-                })
-                return {
-                    "url": url,
-                    "status": "completed",
-                    "title": result.get("title", "Sin título"),
-                    "email": result.get("email", "")
-                }
-    
-    tasks = [process_url_with_semaphore(url) for url in urls]
-    return await asyncio.gather(*tasks)
+                results.append({"url": url, "status": "error", "error": error})
+    return results
 
-async def main(sitemap_url, max_concurrent=3):
+async def main(sitemap_url, max_concurrent=50, total_timeout=None):
     """Función principal del script."""
     send_sse_message("STATUS", f"Iniciando extracción desde {sitemap_url}")
+    load_domain_cache()
     
-    # Paso 1: Extraer URLs del sitemap
-    urls = await get_all_urls_from_sitemap(sitemap_url)
-    if not urls:
-        send_sse_message("ERROR", "No se encontraron URLs en el sitemap")
-        return
-    
-    # Limitar a 10 URLs para pruebas (puedes quitar esta línea)
-    if len(urls) > 10:
-        urls = urls[:10]
-        send_sse_message("STATUS", f"Limitando a {len(urls)} URLs para pruebas")
+    async with create_session(max_concurrent) as session:
+        # Paso 1: Extraer URLs del sitemap
+        urls = await get_all_urls_from_sitemap(sitemap_url, session)
+        if not urls:
+            send_sse_message("ERROR", "No se encontraron URLs en el sitemap")
+            return
+        
+        # Limitar a 10 URLs para pruebas (puedes quitar esta línea)
+        if len(urls) > 10:
+            urls = urls[:10]
+            send_sse_message("STATUS", f"Limitando a {len(urls)} URLs para pruebas")
+        
+        # Paso 2: Procesar cada URL para extraer información
+        results = await process_urls(urls, session, total_timeout)
     
-    # Paso 2: Procesar cada URL para extraer información
-    results = await process_urls(urls, max_concurrent)
+    save_domain_cache()
     
     # Paso 3: Resumir resultados
     completed = [r for r in results if r.get("status") == "completed"]
@@ -216,12 +577,13 @@ async def main(sitemap_url, max_concurrent=3):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extrae información de negocios desde sitemaps XML")
     parser.add_argument("--sitemap", "-s", required=True, help="URL del sitemap XML")
-    parser.add_argument("--max_concurrent", "-c", type=int, default=3, help="Número máximo de solicitudes concurrentes")
+    parser.add_argument("--max_concurrent", "-c", type=int, default=50, help="Número máximo de conexiones simultáneas (máximo 2 por host)")
+    parser.add_argument("--total_timeout", "-t", type=float, default=None, help="Tiempo máximo (segundos) para procesar todas las URLs")
     
     args = parser.parse_args()
     
     try:
-        asyncio.run(main(args.sitemap, args.max_concurrent))
+        asyncio.run(run_with_sse_flusher(main(args.sitemap, args.max_concurrent, args.total_timeout)))
     except Exception as e:
         send_sse_message("ERROR", f"Error fatal durante la extracción: {str(e)}")
         sys.exit(1) 
\ No newline at end of file